@@ -0,0 +1,76 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare the bytes per vector, encode time and error of the matrix encodings, for
+the vocabulary of a fastText model or random vectors:
+
+    python benchmarks/encoding.py --model path/to/model.bin --rows 1000
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# The service package reads its configuration when imported
+root = Path(__file__).parent.parent
+sys.path.insert(0, str(root))
+os.environ.setdefault("SERVICE_CONFIG_PATH", str(root / "sample" / "config.yaml"))
+from fts.protos import model_pb2, service_pb2
+from fts.service.matrix import pack_matrix, unpack_matrix
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", help="fastText model file, random vectors if unset")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--dimension", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.model is not None:
+        import fasttext
+
+        ft_model = fasttext.load_model(args.model)
+        words = ft_model.get_words()[: args.rows]
+        vectors = np.stack([ft_model.get_word_vector(word) for word in words])
+    else:
+        random = np.random.default_rng(0)
+        vectors = random.normal(size=(args.rows, args.dimension)).astype(np.float32)
+
+    repeated = service_pb2.VectorsResponse(
+        vectors=[model_pb2.WordVector(element=vector) for vector in vectors]
+    ).ByteSize()
+    print(f"repeated float: {repeated / len(vectors):.1f} bytes/vector")
+
+    for name, encoding in model_pb2.Matrix.Encoding.items():
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            matrix = pack_matrix(vectors, encoding)
+        encode_time = (time.perf_counter() - start) / args.repeat
+        size = len(matrix.SerializeToString())
+        error = np.abs(unpack_matrix(matrix) - vectors)
+        print(
+            f"{name}: {size / len(vectors):.1f} bytes/vector, "
+            f"encode {encode_time * 1e6 / len(vectors):.2f} us/vector, "
+            f"max error {error.max():.2e}, mean error {error.mean():.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
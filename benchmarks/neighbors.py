@@ -0,0 +1,96 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare the recall@k and queries per second of the approximate nearest neighbors
+index against the exact search, for a fastText model:
+
+    python benchmarks/neighbors.py path/to/model.bin --k 10 --probes 1 4 16
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import fasttext
+import numpy as np
+
+# The service package reads its configuration when imported
+root = Path(__file__).parent.parent
+sys.path.insert(0, str(root))
+os.environ.setdefault("SERVICE_CONFIG_PATH", str(root / "sample" / "config.yaml"))
+from fts.service.neighbors import IVFIndex, normalize, search_exact
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model", help="fastText model file")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--lists", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    ft_model = fasttext.load_model(args.model)
+    words = ft_model.get_words()
+    vectors = np.stack([ft_model.get_word_vector(word) for word in words])
+    normalized = normalize(vectors)
+
+    start = time.time()
+    index = IVFIndex.build(normalized, args.lists, args.iterations)
+    print(
+        f"{len(words)} words, {len(index.centroids)} lists, "
+        f"index built in {time.time() - start:.2f} s"
+    )
+
+    random = np.random.default_rng(0)
+    rows = random.choice(len(words), min(args.queries, len(words)), replace=False)
+    queries = normalized[rows]
+    batches = [
+        (queries[i : i + args.batch], rows[i : i + args.batch])
+        for i in range(0, len(rows), args.batch)
+    ]
+
+    start = time.time()
+    exact = [
+        search_exact(normalized, batch_queries, args.k, batch_rows)[0]
+        for batch_queries, batch_rows in batches
+    ]
+    exact_qps = len(rows) / (time.time() - start)
+    exact = np.concatenate(exact)
+    print(f"exact: recall@{args.k} 1.000, {exact_qps:.0f} queries/s")
+
+    for probes in args.probes:
+        start = time.time()
+        approximate = [
+            ids
+            for batch_queries, batch_rows in batches
+            for ids in index.search(batch_queries, args.k, probes, batch_rows)[0]
+        ]
+        qps = len(rows) / (time.time() - start)
+        recall = np.mean(
+            [len(np.intersect1d(a, e)) / len(e) for a, e in zip(approximate, exact)]
+        )
+        print(
+            f"probes {probes}: recall@{args.k} {recall:.3f}, {qps:.0f} queries/s "
+            f"({qps / exact_qps:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
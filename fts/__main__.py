@@ -12,27 +12,68 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import os
+import signal
 import sys
-import time
 from concurrent import futures
 
 import grpc
 import grpc_health.v1.health_pb2 as health_pb2
 import grpc_health.v1.health_pb2_grpc as health_pb2_grpc
 from fts.protos import service_pb2_grpc
-from fts.server import FastTextServicer
+from fts.server import AsyncFastTextServicer, FastTextServicer
+from fts.server.workers import WorkerPool
+from fts.service import FastTextService
 from fts.utils.config import get_config
 from fts.utils.logger import get_logger
 from grpc_health.v1.health import HealthServicer
 
-_ONE_DAY_IN_SECONDS = 60 * 60 * 24
+# Seconds a replaced server process has to finish its requests in progress
+_STOP_GRACE_SECONDS = 30
 
 
 def serve():
     logger = get_logger()
     logger.info("FastText server starting ...")
 
+    # Read gRPC options
+    config = get_config()
+    grpc_processes = config["grpc"].get("processes", 1)
+    logger.info("Server processes: {}".format(grpc_processes))
+
+    if grpc_processes == 1:
+        _start(FastTextService())
+        return
+
+    # Load the models before forking, so worker processes share their memory pages.
+    # Only this process loads models, the workers are rolled when it reloads one
+    if config.get("lazy_loading", {}).get("enabled", False):
+        logger.warning("Lazy loading is disabled in server processes")
+    fasttext_service = FastTextService(watch_models=False)
+    workers = WorkerPool(_run_worker, grpc_processes, args=(fasttext_service,))
+    fasttext_service.watch_models(on_reload=workers.roll)
+    workers.roll()
+    workers.wait()
+
+
+def _run_worker(fasttext_service, ready):
+    fasttext_service.serve_loaded_models()
+    _start(fasttext_service, reuse_port=True, ready=ready)
+
+
+def _start(fasttext_service, reuse_port=False, ready=None):
+    grpc_mode = get_config()["grpc"].get("mode", "sync")
+    get_logger().info("gRPC server mode: {}".format(grpc_mode))
+    if grpc_mode == "aio":
+        asyncio.run(_run_aio_server(fasttext_service, reuse_port, ready))
+    else:
+        _run_server(fasttext_service, reuse_port, ready)
+
+
+def _get_server_options(reuse_port):
+    logger = get_logger()
+
     # Read gRPC options
     config = get_config()
     grpc_port = config["grpc"].get("port", 50051)
@@ -47,6 +88,22 @@ def serve():
         logger.info("gRPC channel option: {}".format(option))
         grpc_options.append(option)
 
+    # Every worker process listens on the same port
+    if reuse_port:
+        grpc_options.append(("grpc.so_reuseport", 1))
+
+    return grpc_port, grpc_max_workers, grpc_maximum_concurrent_rpcs, grpc_options
+
+
+def _run_server(fasttext_service, reuse_port=False, ready=None):
+    logger = get_logger()
+    (
+        grpc_port,
+        grpc_max_workers,
+        grpc_maximum_concurrent_rpcs,
+        grpc_options,
+    ) = _get_server_options(reuse_port)
+
     # Create server
     server = grpc.server(
         futures.ThreadPoolExecutor(max_workers=grpc_max_workers),
@@ -55,7 +112,7 @@ def serve():
     )
 
     # Add servicers
-    servicer = FastTextServicer()
+    servicer = FastTextServicer(fasttext_service)
     service_pb2_grpc.add_FastTextServicer_to_server(servicer, server)
     health_servicer = HealthServicer()
     health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
@@ -72,13 +129,67 @@ def serve():
     health_servicer.set("", status_code)
     logger.info("gRPC health check protocol: {}".format(status_code))
 
+    # Server processes are stopped when a newer generation replaces them
+    if ready is not None:
+        signal.signal(signal.SIGTERM, lambda *args: server.stop(_STOP_GRACE_SECONDS))
+        ready.set()
+
     try:
-        while True:
-            time.sleep(_ONE_DAY_IN_SECONDS)
+        server.wait_for_termination()
     except KeyboardInterrupt:
         server.stop(0)
         servicer = None
 
 
+async def _run_aio_server(fasttext_service, reuse_port=False, ready=None):
+    # Only needed by the aio mode, older releases of grpcio-health-checking lack it
+    from grpc_health.v1.health import aio
+
+    logger = get_logger()
+    (
+        grpc_port,
+        grpc_max_workers,
+        grpc_maximum_concurrent_rpcs,
+        grpc_options,
+    ) = _get_server_options(reuse_port)
+
+    # Create server, blocking fastText calls are run in a pool of max_workers threads
+    server = grpc.aio.server(
+        maximum_concurrent_rpcs=grpc_maximum_concurrent_rpcs,
+        options=grpc_options,
+    )
+
+    # Add servicers
+    servicer = AsyncFastTextServicer(fasttext_service, max_workers=grpc_max_workers)
+    service_pb2_grpc.add_FastTextServicer_to_server(servicer, server)
+    health_servicer = aio.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+
+    # Run server
+    address = "[::]:{}".format(grpc_port)
+    server.add_insecure_port(address)
+    await server.start()
+    logger.info("Listening incoming connections at {}".format(address))
+
+    # Mark the server as running using gRPC health check protocol
+    serving_status = health_pb2._HEALTHCHECKRESPONSE_SERVINGSTATUS
+    status_code = serving_status.values_by_name["SERVING"].number
+    await health_servicer.set("", status_code)
+    logger.info("gRPC health check protocol: {}".format(status_code))
+
+    # Server processes are stopped when a newer generation replaces them
+    if ready is not None:
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM,
+            lambda: asyncio.ensure_future(server.stop(_STOP_GRACE_SECONDS)),
+        )
+        ready.set()
+
+    try:
+        await server.wait_for_termination()
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        await server.stop(0)
+
+
 if __name__ == "__main__":
     serve()
@@ -12,4 +12,5 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .server import FastTextServicer
\ No newline at end of file
+from .server import FastTextServicer
+from .aio_server import AsyncFastTextServicer
\ No newline at end of file
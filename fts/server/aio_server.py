@@ -0,0 +1,78 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import asyncio
+from concurrent import futures
+
+from fts.protos import service_pb2_grpc
+from fts.service import FastTextService
+from fts.service.exceptions import (
+    map_exceptions_grpc_async,
+    map_exceptions_grpc_async_stream,
+)
+
+
+class AsyncFastTextServicer(service_pb2_grpc.FastTextServicer):
+    """
+    Coroutine handlers for a grpc.aio server. Blocking calls to the service are
+    run in a bounded thread pool, while waiting requests only cost a coroutine
+    """
+
+    def __init__(self, fasttext_service: FastTextService = None, max_workers=2):
+        if fasttext_service is None:
+            fasttext_service = FastTextService()
+        self._fasttext_service = fasttext_service
+        self._executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    @map_exceptions_grpc_async
+    async def Predict(self, request, context):
+        return await self._run(self._fasttext_service.predict, request)
+
+    @map_exceptions_grpc_async_stream
+    async def PredictStream(self, request_iterator, context):
+        async for request in request_iterator:
+            yield await self._run(self._fasttext_service.predict, request)
+
+    @map_exceptions_grpc_async
+    async def GetLoadedModels(self, request, context):
+        return await self._run(self._fasttext_service.get_loaded_models)
+
+    @map_exceptions_grpc_async
+    async def GetModelStatus(self, request, context):
+        return await self._run(self._fasttext_service.get_model_status, request)
+
+    @map_exceptions_grpc_async
+    async def LoadModels(self, request, context):
+        return await self._run(self._fasttext_service.load_models, request)
+
+    @map_exceptions_grpc_async
+    async def ReloadConfigModels(self, request, context):
+        return await self._run(self._fasttext_service.load_models_in_config_file)
+
+    @map_exceptions_grpc_async
+    async def GetWordsVectors(self, request, context):
+        return await self._run(self._fasttext_service.get_words_vectors, request)
+
+    @map_exceptions_grpc_async
+    async def GetSentenceVectors(self, request, context):
+        return await self._run(self._fasttext_service.get_sentence_vectors, request)
+
+    @map_exceptions_grpc_async
+    async def GetNearestNeighbors(self, request, context):
+        return await self._run(self._fasttext_service.get_nearest_neighbors, request)
@@ -15,17 +15,23 @@
 import grpc
 from fts.service import FastTextService
 from fts.protos import service_pb2_grpc
-from fts.service.exceptions import map_exceptions_grpc
+from fts.service.exceptions import map_exceptions_grpc, map_exceptions_grpc_stream
 
 
 class FastTextServicer(service_pb2_grpc.FastTextServicer):
-    def __init__(self):
-        self._fasttext_service = FastTextService()
+    def __init__(self, fasttext_service: FastTextService = None):
+        if fasttext_service is None:
+            fasttext_service = FastTextService()
+        self._fasttext_service = fasttext_service
 
     @map_exceptions_grpc
     def Predict(self, request, context):
         return self._fasttext_service.predict(request)
 
+    @map_exceptions_grpc_stream
+    def PredictStream(self, request_iterator, context):
+        return self._fasttext_service.predict_stream(request_iterator)
+
     @map_exceptions_grpc
     def GetLoadedModels(self, request, context):
         return self._fasttext_service.get_loaded_models()
@@ -45,3 +51,11 @@ class FastTextServicer(service_pb2_grpc.FastTextServicer):
     @map_exceptions_grpc
     def GetWordsVectors(self, request, context):
         return self._fasttext_service.get_words_vectors(request)
+
+    @map_exceptions_grpc
+    def GetSentenceVectors(self, request, context):
+        return self._fasttext_service.get_sentence_vectors(request)
+
+    @map_exceptions_grpc
+    def GetNearestNeighbors(self, request, context):
+        return self._fasttext_service.get_nearest_neighbors(request)
@@ -0,0 +1,83 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import multiprocessing
+import time
+from threading import Lock
+
+from fts.utils.logger import get_logger
+
+logger = get_logger()
+
+
+class WorkerPool(object):
+    """
+    Server processes forked from the process that loads the models, so they share
+    its memory pages and it accounts their memory once. When the parent loads a new
+    version the pool is rolled: a new generation of workers is forked with it, and
+    the previous workers are stopped once the new ones are listening, finishing
+    their requests in progress.
+    The target is called as target(*args, ready) in every worker, and must set the
+    ready event once it is listening and stop gracefully on SIGTERM
+    """
+
+    def __init__(self, target, processes: int, args=(), ready_timeout: float = 60):
+        self._target = target
+        self._processes = processes
+        self._args = args
+        self._ready_timeout = ready_timeout
+        self._context = multiprocessing.get_context("fork")
+        self._lock = Lock()
+        self._workers = []
+
+    def roll(self):
+        """
+        Fork a new generation of workers, then stop the previous one
+        """
+        with self._lock:
+            previous = self._workers
+            started = []
+            for _ in range(self._processes):
+                ready = self._context.Event()
+                worker = self._context.Process(
+                    target=self._target, args=(*self._args, ready)
+                )
+                worker.start()
+                started.append((worker, ready))
+            self._workers = [worker for worker, _ in started]
+
+            for worker, ready in started:
+                if not ready.wait(self._ready_timeout):
+                    logger.warning(f"Server process {worker.pid} is not ready yet")
+            for worker in previous:
+                worker.terminate()
+            logger.info(
+                f"Server processes {[worker.pid for worker in self._workers]} started"
+            )
+
+    def wait(self):
+        """
+        Run until every worker exits or the parent is interrupted, then stop them
+        """
+        try:
+            while any(worker.is_alive() for worker in self._workers):
+                # Also joins the stopped workers of previous generations
+                multiprocessing.active_children()
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            with self._lock:
+                for worker in self._workers:
+                    worker.terminate()
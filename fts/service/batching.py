@@ -0,0 +1,146 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future
+from threading import Condition, Lock, Thread
+
+from fts.protos import model_pb2
+from fts.service.exceptions import FastTextException
+
+
+class PredictBatcher(object):
+    """
+    Merges concurrent predictions for the same model and parameters into a single
+    fastText call, bounded by a maximum batch size and a maximum wait time.
+    Each model and parameters have a worker thread while they receive requests,
+    it exits once its queue has been empty for the maximum wait time
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int, max_wait_ms: float):
+        self._predict_fn = predict_fn
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000.0
+        self._condition = Condition()
+        self._queues = defaultdict(deque)
+        self._workers = {}
+        self._stats_lock = Lock()
+        # Batches, requests and sentences of each model
+        self._stats = defaultdict(lambda: [0, 0, 0])
+
+    def predict(self, model_name: str, sentences: list, *parameters):
+        """
+        Enqueue the sentences and block until their batch has been predicted with
+        the same parameters. Returns the model record used and the labels and scores
+        of the sentences
+        """
+        # fastText rejects the whole batch if one sentence has a newline
+        if any("\n" in sentence for sentence in sentences):
+            raise FastTextException(
+                "predict processes one line at a time (remove '\\n')"
+            )
+        future = Future()
+        key = (model_name,) + parameters
+        with self._condition:
+            self._queues[key].append((time.monotonic(), sentences, future))
+            if key not in self._workers:
+                worker = Thread(target=self._run, args=(key,), daemon=True)
+                self._workers[key] = worker
+                worker.start()
+            self._condition.notify_all()
+        return future.result()
+
+    def get_stats(self, model_name: str) -> model_pb2.BatchingStats:
+        with self._stats_lock:
+            batches, requests, sentences = self._stats.get(model_name, (0, 0, 0))
+        return model_pb2.BatchingStats(
+            batches=batches,
+            requests=requests,
+            sentences=sentences,
+            mean_fill_ratio=(
+                sentences / (batches * self._max_batch_size) if batches > 0 else 0.0
+            ),
+        )
+
+    def _run(self, key):
+        while True:
+            items = self._next_batch(key)
+            if items is None:
+                return
+            sentences = [sentence for _, batch, _ in items for sentence in batch]
+            with self._stats_lock:
+                counters = self._stats[key[0]]
+                counters[0] += 1
+                counters[1] += len(items)
+                counters[2] += len(sentences)
+
+            try:
+                model, labels, scores = self._predict_fn(key[0], sentences, *key[1:])
+            except Exception as ex:
+                self._predict_each(key, items, ex)
+                continue
+
+            # Split the results back to each caller
+            offset = 0
+            for _, batch, future in items:
+                end = offset + len(batch)
+                future.set_result((model, labels[offset:end], scores[offset:end]))
+                offset = end
+
+    def _predict_each(self, key, items, exception: Exception):
+        """
+        Predict every request of a failed batch on its own, so only the requests
+        that fail by themselves get an exception
+        """
+        if len(items) == 1:
+            items[0][2].set_exception(exception)
+            return
+        for _, batch, future in items:
+            try:
+                future.set_result(self._predict_fn(key[0], batch, *key[1:]))
+            except Exception as ex:
+                future.set_exception(ex)
+
+    def _next_batch(self, key):
+        """
+        Wait for the next batch of a key, or return None and remove the worker of
+        the key if no request arrives for the maximum wait time
+        """
+        with self._condition:
+            queue = self._queues[key]
+            deadline = time.monotonic() + self._max_wait
+            while len(queue) == 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    del self._queues[key]
+                    del self._workers[key]
+                    return None
+                self._condition.wait(remaining)
+
+            # Wait until the batch is full or the oldest request times out
+            deadline = queue[0][0] + self._max_wait
+            while sum(len(item[1]) for item in queue) < self._max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            # Take whole requests up to the maximum batch size
+            items = [queue.popleft()]
+            size = len(items[0][1])
+            while len(queue) > 0 and size + len(queue[0][1]) <= self._max_batch_size:
+                size += len(queue[0][1])
+                items.append(queue.popleft())
+        return items
@@ -0,0 +1,130 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future
+from threading import Lock
+
+from fts.protos import model_pb2
+
+# Approximate bookkeeping cost of an entry: key tuple, dict slot and message
+_ENTRY_OVERHEAD = 256
+
+
+class PredictionCache(object):
+    """
+    Bounded LRU cache of predictions keyed by model name, model version, prediction
+    parameters (k, threshold, labels) and text.
+    Identical texts being computed at the same time share a single computation
+    """
+
+    def __init__(self, max_memory: int):
+        self._max_memory = max_memory
+        self._memory = 0
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._stats = defaultdict(lambda: [0, 0, 0, 0])  # hits, misses, entries, bytes
+
+    def get_or_compute(
+        self, model_name: str, version: int, parameters, texts, compute_fn
+    ):
+        """
+        Get the cached value of every text, calling compute_fn once with the texts
+        that are neither cached nor being computed by another request
+        """
+        results = [None] * len(texts)
+        owned = []
+        waiting = []
+        with self._lock:
+            stats = self._stats[model_name]
+            for index, text in enumerate(texts):
+                key = (model_name, version, parameters, text)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    results[index] = self._entries[key][0]
+                    stats[0] += 1
+                elif key in self._in_flight:
+                    waiting.append((index, self._in_flight[key]))
+                    stats[0] += 1
+                else:
+                    future = Future()
+                    self._in_flight[key] = future
+                    owned.append((index, key, future))
+                    stats[1] += 1
+
+        if len(owned) > 0:
+            try:
+                values = compute_fn([key[3] for _, key, _ in owned])
+            except Exception as ex:
+                with self._lock:
+                    for _, key, future in owned:
+                        del self._in_flight[key]
+                        future.set_exception(ex)
+                raise
+
+            with self._lock:
+                for (index, key, future), value in zip(owned, values):
+                    del self._in_flight[key]
+                    self._put(key, value)
+                    future.set_result(value)
+                    results[index] = value
+
+        for index, future in waiting:
+            results[index] = future.result()
+        return results
+
+    def invalidate(self, model_name: str, kept_versions=()):
+        """
+        Drop the entries of a model except those of the kept versions, e.g. the
+        versions still served when a new version is loaded
+        """
+        with self._lock:
+            for key in [
+                key
+                for key in self._entries
+                if key[0] == model_name and key[1] not in kept_versions
+            ]:
+                self._remove(key)
+
+    def get_stats(self, model_name: str) -> model_pb2.CacheStats:
+        with self._lock:
+            hits, misses, entries, memory = self._stats[model_name]
+        return model_pb2.CacheStats(
+            hits=hits, misses=misses, entries=entries, memory=memory
+        )
+
+    def _put(self, key, value):
+        size = _ENTRY_OVERHEAD + sys.getsizeof(key[3]) + value.ByteSize()
+        if size > self._max_memory:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, size)
+        self._memory += size
+        stats = self._stats[key[0]]
+        stats[2] += 1
+        stats[3] += size
+
+        # Evict the least recently used entries
+        while self._memory > self._max_memory:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        size = self._entries.pop(key)[1]
+        self._memory -= size
+        stats = self._stats[key[0]]
+        stats[2] -= 1
+        stats[3] -= size
@@ -0,0 +1,249 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from hashlib import blake2b
+from threading import Event, Lock, Thread
+
+import numpy as np
+
+from fts.protos import model_pb2
+from fts.utils.logger import get_logger
+
+logger = get_logger()
+
+# Size kept after a compaction, as a fraction of the maximum size
+_COMPACTION_TARGET = 0.9
+
+# Entries deleted at once when compacting
+_COMPACTION_BATCH = 1000
+
+# Keys looked up in a single query, below the SQLite limit of variables
+_QUERY_BATCH = 500
+
+# Hits whose access time is kept in memory before a compaction writes them
+_MAX_ACCESSES = 100000
+
+# Approximate size of an entry: its key, value and bookkeeping of its row
+_ENTRY_SIZE = "LENGTH(model) + LENGTH(key) + LENGTH(value) + 32"
+_SIZE = f"COALESCE(SUM({_ENTRY_SIZE}), 0)"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    model TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    operation TEXT NOT NULL,
+    key BLOB NOT NULL,
+    value BLOB NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (model, version, operation, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+
+class DiskCache(object):
+    """
+    Persistent cache of serialized results in a SQLite database, keyed by model
+    name, model version, operation and a hash of the parameters and input text.
+    It survives restarts and is shared by the processes of the host. Hits do not
+    write to the database, a background thread writes their access times, drops
+    the entries of old model versions and the least recently used ones when the
+    database exceeds its maximum size
+    """
+
+    def __init__(self, path: str, max_size: int, compaction_interval: float = 60):
+        self._path = path
+        self._max_size = max_size
+        self._compaction_interval = compaction_interval
+        self._lock = Lock()
+        self._stats = defaultdict(lambda: [0, 0])  # hits, misses
+        self._active_versions = {}
+        self._accesses = {}  # entry primary key: time of its last hit
+        self._pid = None
+
+        # Fail at startup if the database cannot be created or opened
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            self._connect()
+
+    def get_or_compute(
+        self,
+        model_name: str,
+        version: int,
+        operation: str,
+        parameters,
+        texts,
+        compute_fn,
+        encode,
+        decode,
+    ):
+        """
+        Get the stored value of every text, calling compute_fn with the missing
+        ones and storing their values. Values are stored as encode(value) bytes
+        and read with decode(bytes)
+        """
+        keys = [self._get_key(parameters, text) for text in texts]
+        with self._lock:
+            connection = self._connect()
+            stored = {}
+            for start in range(0, len(keys), _QUERY_BATCH):
+                batch = keys[start : start + _QUERY_BATCH]
+                stored.update(
+                    connection.execute(
+                        "SELECT key, value FROM entries "
+                        "WHERE model = ? AND version = ? AND operation = ? "
+                        f"AND key IN ({','.join('?' * len(batch))})",
+                        (model_name, version, operation, *batch),
+                    )
+                )
+            now = time.time()
+            for key in stored:
+                self._accesses[(model_name, version, operation, key)] = now
+            if len(self._accesses) >= _MAX_ACCESSES:
+                self._compact_event.set()
+            stats = self._stats[model_name]
+            stats[0] += sum(key in stored for key in keys)
+            stats[1] += sum(key not in stored for key in keys)
+
+        results = [decode(stored[key]) if key in stored else None for key in keys]
+        missing = [index for index, key in enumerate(keys) if key not in stored]
+        if len(missing) > 0:
+            values = compute_fn([texts[index] for index in missing])
+            for index, value in zip(missing, values):
+                results[index] = value
+            with self._lock:
+                connection = self._connect()
+                connection.executemany(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (model_name, version, operation, keys[i], encode(v), now)
+                        for i, v in zip(missing, values)
+                    ],
+                )
+                connection.commit()
+        return results
+
+    def drop_old_versions(self, model_name: str, versions):
+        """
+        Drop the entries of every other version of a model in the background, once
+        these versions are the ones served
+        """
+        with self._lock:
+            self._active_versions[model_name] = tuple(versions)
+            if self._pid == os.getpid():
+                self._compact_event.set()
+
+    def get_stats(self, model_name: str) -> model_pb2.CacheStats:
+        with self._lock:
+            hits, misses = self._stats[model_name]
+            entries, memory = (
+                self._connect()
+                .execute(
+                    f"SELECT COUNT(*), {_SIZE} FROM entries WHERE model = ?",
+                    (model_name,),
+                )
+                .fetchone()
+            )
+        return model_pb2.CacheStats(
+            hits=hits, misses=misses, entries=entries, memory=memory
+        )
+
+    @staticmethod
+    def _get_key(parameters, text: str) -> bytes:
+        return blake2b(f"{parameters!r}\0{text}".encode(), digest_size=16).digest()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Get the connection of this process. Connections and threads do not survive
+        a fork, so every worker process opens its own when it is first used
+        """
+        if self._pid != os.getpid():
+            connection = sqlite3.connect(
+                self._path, timeout=30, check_same_thread=False
+            )
+            connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            connection.execute("PRAGMA journal_mode = WAL")
+            # Durable at checkpoints, a crash may only lose the latest entries
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+            self._compact_event = Event()
+            if len(self._active_versions) > 0:
+                self._compact_event.set()
+            Thread(target=self._run_compaction, daemon=True).start()
+        return self._connection
+
+    def _run_compaction(self):
+        while True:
+            self._compact_event.wait(self._compaction_interval)
+            self._compact_event.clear()
+            try:
+                self._compact()
+            except sqlite3.Error as ex:
+                logger.warning(f"Error compacting the disk cache {self._path}: {ex}")
+
+    def _compact(self):
+        with self._lock:
+            connection = self._connection
+            accesses, self._accesses = self._accesses, {}
+            connection.executemany(
+                "UPDATE entries SET accessed = ? "
+                "WHERE model = ? AND version = ? AND operation = ? AND key = ?",
+                [(accessed, *entry) for entry, accessed in accesses.items()],
+            )
+            for model_name, versions in self._active_versions.items():
+                connection.execute(
+                    "DELETE FROM entries WHERE model = ? "
+                    f"AND version NOT IN ({','.join('?' * len(versions))})",
+                    (model_name, *versions),
+                )
+            connection.commit()
+
+        # Drop the least recently used entries, a batch at a time so requests are
+        # not blocked for long
+        with self._lock:
+            size = connection.execute(f"SELECT {_SIZE} FROM entries").fetchone()[0]
+        if size <= self._max_size:
+            return
+        while size > self._max_size * _COMPACTION_TARGET:
+            with self._lock:
+                entries = connection.execute(
+                    f"SELECT model, version, operation, key, {_ENTRY_SIZE} "
+                    "FROM entries ORDER BY accessed LIMIT ?",
+                    (_COMPACTION_BATCH,),
+                ).fetchall()
+                if len(entries) == 0:
+                    break
+
+                # Only the entries needed to reach the target size
+                excess = size - self._max_size * _COMPACTION_TARGET
+                sizes = np.cumsum([entry[4] for entry in entries])
+                entries = entries[: np.searchsorted(sizes, excess) + 1]
+                connection.executemany(
+                    "DELETE FROM entries "
+                    "WHERE model = ? AND version = ? AND operation = ? AND key = ?",
+                    [entry[:4] for entry in entries],
+                )
+                connection.commit()
+            size -= sum(entry[4] for entry in entries)
+
+        # Return the free pages to the file system
+        with self._lock:
+            connection.execute("PRAGMA incremental_vacuum")
+            connection.commit()
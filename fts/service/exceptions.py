@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import grpc
+import sqlite3
 from functools import wraps
 from google.protobuf.empty_pb2 import Empty
 
@@ -38,10 +39,19 @@ class FastTextException(Exception):
     pass
 
 
+class NotEnabledException(Exception):
+    """
+    The feature has not been enabled in the configuration
+    """
+    pass
+
+
 EXC_MAPPING = {
     ModelNotLoadedException: grpc.StatusCode.FAILED_PRECONDITION,
     MissingArgumentException: grpc.StatusCode.INVALID_ARGUMENT,
     FastTextException: grpc.StatusCode.UNKNOWN,
+    NotEnabledException: grpc.StatusCode.FAILED_PRECONDITION,
+    sqlite3.Error: grpc.StatusCode.INTERNAL,
 }
 
 
@@ -51,10 +61,49 @@ def map_exceptions_grpc(function):
         try:
             return function(*args, **kwargs)
         except Exception as ex:
-            for exc_key in EXC_MAPPING:
-                if isinstance(ex, exc_key):
-                    context.set_code(EXC_MAPPING[exc_key])
-                    context.set_details(str(ex))
+            _set_grpc_error(context, ex)
+            return Empty()
+
+    return wrapper
+
+
+def map_exceptions_grpc_stream(function):
+    def wrapper(*args, **kwargs):
+        context = args[2]
+        try:
+            yield from function(*args, **kwargs)
+        except Exception as ex:
+            _set_grpc_error(context, ex)
+
+    return wrapper
+
+
+def map_exceptions_grpc_async(function):
+    async def wrapper(*args, **kwargs):
+        context = args[2]
+        try:
+            return await function(*args, **kwargs)
+        except Exception as ex:
+            _set_grpc_error(context, ex)
             return Empty()
 
     return wrapper
+
+
+def map_exceptions_grpc_async_stream(function):
+    async def wrapper(*args, **kwargs):
+        context = args[2]
+        try:
+            async for response in function(*args, **kwargs):
+                yield response
+        except Exception as ex:
+            _set_grpc_error(context, ex)
+
+    return wrapper
+
+
+def _set_grpc_error(context, ex):
+    for exc_key in EXC_MAPPING:
+        if isinstance(ex, exc_key):
+            context.set_code(EXC_MAPPING[exc_key])
+            context.set_details(str(ex))
@@ -13,117 +13,529 @@
 # limitations under the License.
 
 import os
+import shutil
+import sys
+import tempfile
 import yaml
 import time
 import fasttext
-from collections import namedtuple
+import numpy as np
+from collections import Counter, defaultdict, namedtuple
+from concurrent import futures
+from contextlib import contextmanager
+from functools import partial, wraps
 from pathlib import Path
+from threading import BoundedSemaphore, Lock
 
+from fts.service.batching import PredictBatcher
+from fts.service.cache import PredictionCache
+from fts.service.disk_cache import DiskCache
+from fts.service.matrix import check_encoding, pack_matrix, unpack_matrix
+from fts.service.neighbors import IVFIndex, normalize, search_exact
+from fts.service.repository import ModelRepository
+from fts.service.sharding import ShardPool
+from fts.service.store import EmbeddingStore
+from fts.service.watcher import ModelWatcher
 from fts.service.exceptions import (
     FastTextException,
     MissingArgumentException,
     ModelNotLoadedException,
+    NotEnabledException,
 )
 from fts.protos import model_pb2, service_pb2
 from fts.utils.config import get_config, load_config
 from fts.utils.logger import get_logger
-from watchdog.events import FileSystemEventHandler
-from watchdog.observers import Observer
+from fts.utils.memory import get_rss
 
-Model = namedtuple("Model", "pb_model ft_model size state")
+Model = namedtuple(
+    "Model",
+    "pb_model ft_model size state labels vocabulary index estimated_size",
+    defaults=(None, None, None, None),
+)
+LabelTable = namedtuple("LabelTable", "names ft_labels ids name_ids")
+Vocabulary = namedtuple("Vocabulary", "words rows matrix normalized memory load_time")
 config = get_config()
 logger = get_logger()
 
 
-class ModelUpdateHandler(FileSystemEventHandler):
-    def __init__(self, fasttext_service):
-        self._fasttext_service = fasttext_service
+def _tracks_requests(method):
+    """
+    Count the requests in progress to the model of the request, models with
+    requests in progress are not evicted
+    """
+
+    @wraps(method)
+    def wrapper(self, request):
+        with self._using_model(request.model_name):
+            return method(self, request)
 
-    def on_created(self, event):
-        self._fasttext_service._handle_file_update(Path(event.src_path))
+    return wrapper
 
 
 class FastTextService(object):
-    def __init__(self):
+    def __init__(self, watch_models: bool = True):
+
+        # Duplicated inputs found in the requests of each model
+        self._duplicates = defaultdict(int)
+        self._duplicates_lock = Lock()
+
+        # Dynamic batching of concurrent predictions
+        batching = config.get("batching", {})
+        if batching.get("enabled", False):
+            self._batcher = PredictBatcher(
+                self._predict,
+                int(batching.get("max_batch_size", 256)),
+                float(batching.get("max_wait_ms", 5)),
+            )
+        else:
+            self._batcher = None
+
+        # Predict the shards of very large batches in a pool of processes
+        sharding = config.get("sharding", {})
+        if sharding.get("enabled", False):
+            self._shards = ShardPool(
+                self._get_ft_models,
+                int(sharding.get("processes", 4)),
+                int(sharding.get("shard_size", 10000)),
+                int(sharding.get("max_shards", 4)),
+            )
+        else:
+            self._shards = None
+
+        # Precompute the vectors of the vocabulary words when loading models
+        vectors = config.get("vectors", {})
+        self._nearest_neighbors = vectors.get("nearest_neighbors", False)
+
+        # Export the vocabulary vectors next to each model and memory-map them
+        self._embedding_store = vectors.get("embedding_store", False)
+
+        # Approximate nearest neighbors index saved with each model version
+        ann_index = vectors.get("ann_index", {})
+        self._ann_index = ann_index.get("enabled", False)
+        self._ann_lists = int(ann_index.get("lists", 0))
+        self._ann_iterations = int(ann_index.get("iterations", 10))
+        self._ann_probes = int(ann_index.get("probes", 8))
+
+        self._vocabulary_matrix = (
+            vectors.get("vocabulary_matrix", False)
+            or self._nearest_neighbors
+            or self._ann_index
+            or self._embedding_store
+        )
+
+        # Cache of repeated predictions
+        cache = config.get("cache", {})
+        if cache.get("enabled", False):
+            self._cache = PredictionCache(int(cache.get("max_memory", 100000000)))
+        else:
+            self._cache = None
+
+        # Persistent cache of predictions and sentence vectors, behind the cache
+        disk_cache = config.get("disk_cache", {})
+        if disk_cache.get("enabled", False):
+            self._disk_cache = DiskCache(
+                disk_cache.get("path", "fts-cache.sqlite"),
+                int(disk_cache.get("max_size", 1000000000)),
+                float(disk_cache.get("compaction_interval", 60)),
+            )
+        else:
+            self._disk_cache = None
+
+        # Models are loaded, evicted and used from several threads
+        self._models_lock = Lock()
+        self._measure_lock = Lock()
+        self._base_paths = {}
+        self._repository = ModelRepository()
+        self._in_flight = defaultdict(int)
+
+        # A new version of a model starts a new generation, the replaced version is
+        # retired until the requests of the previous generations finish
+        self._generations = defaultdict(int)
+        self._generation_requests = defaultdict(Counter)
+        self._warmup_sentences = int(
+            config.get("loading", {}).get("warmup_sentences", 100)
+        )
+
+        # New versions found by the watcher are loaded one at a time
+        self._reload_pool = futures.ThreadPoolExecutor(max_workers=1)
+        self._on_reload = None
+        self._loads_models = True
+
+        # Load available models when requested, evicting the least recently used
+        lazy_loading = config.get("lazy_loading", {})
+        self._lazy_loading = lazy_loading.get("enabled", False)
+        self._pinned_models = set(lazy_loading.get("pinned", []))
+        self._loads_semaphore = BoundedSemaphore(
+            int(lazy_loading.get("max_concurrent_loads", 2))
+        )
+        self._loading_locks = {}
+        self._last_used = {}
+        # Loads, evictions and misses of each model
+        self._lazy_loading_stats = defaultdict(lambda: [0, 0, 0])
 
         self.load_models_in_config_file()
+        if watch_models:
+            self.watch_models()
 
-        # Start watchdog
-        self._observer = Observer()
-        self._observer.schedule(
-            ModelUpdateHandler(self), path=config["models_path"], recursive=True
+    def watch_models(self, on_reload=None):
+        """
+        Start the watcher of the models path, calling on_reload once a new version
+        is loaded. Its threads do not survive a fork, so it runs in the process
+        that loads the models
+        """
+        self._on_reload = on_reload
+        watcher = config.get("watcher", {})
+        self._watcher = ModelWatcher(
+            config["models_path"],
+            lambda: list(self._configured_models),
+            self._repository,
+            self._reload_model,
+            debounce=float(watcher.get("debounce", 1)),
+            marker=watcher.get("marker", ""),
+            polling=watcher.get("mode", "inotify") == "polling",
+            poll_interval=float(watcher.get("poll_interval", 10)),
         )
-        self._observer.start()
+        self._watcher.start()
+
+    def serve_loaded_models(self):
+        """
+        Serve the models loaded so far without loading any other, in a worker
+        process forked from the process that loads them. Other threads of that
+        process may have held its locks when forking, so they are created again
+        """
+        self._loads_models = False
+        self._models_lock = Lock()
+        self._repository = ModelRepository()
+
+    def _check_loading(self):
+        if not self._loads_models:
+            raise NotEnabledException(
+                "Models are loaded by the parent process of the server processes"
+            )
 
     def load_models_in_config_file(self) -> service_pb2.LoadModelsResponse:
+        self._check_loading()
         self._memory_factor = float(config["memory"]["memory_factor"])
+        self._measure_memory = config["memory"].get("measure", True)
         self._available_memory = int(config["memory"]["available_memory"])
         self._configured_models = self._get_models_from_config()
+        self._served_versions = {
+            model["name"]: int(model.get("versions", 1))
+            for model in load_config()["models"]
+        }
         self._models = {}
+        self._served = defaultdict(dict)
+        self._retired = defaultdict(list)
 
-        success = True
-        for base_path, model_name in self._configured_models.items():
-            if success:
-                success = self._load_model(model_name, Path(base_path))
-            else:
-                self._load_model(model_name, Path(base_path))
+        # Load the models one at a time, fastText holds the GIL while loading
+        start = time.time()
+        reports = [
+            self._timed_load_model(name, Path(base_path))
+            for base_path, name in self._configured_models.items()
+        ]
+        self._log_load_report(reports, time.time() - start)
 
+        success = all(loaded for _, loaded, _, _ in reports)
         return service_pb2.LoadModelsResponse(success=success)
 
-    def _load_model(self, name: str, base_path: Path):
-        path = self._get_latest_version_path(base_path)
-        if path is not None:
+    def _timed_load_model(self, name: str, base_path: Path):
+        start = time.time()
+        self._repository.scan(str(base_path))
+        loaded, size = self._load_served_versions(name, base_path)
+        return name, loaded, time.time() - start, size
 
-            # Check if model was already loaded
-            if (
-                name in self._models
-                and self._models[name].state == model_pb2.ModelStatus.LOADED
-            ):
-                old_size = self._models[name].size
-            else:
-                old_size = 0
+    def _load_served_versions(self, name: str, base_path: Path, evict: bool = False):
+        """
+        Load the latest versions served by a model, the latest one first so it has
+        the memory before the previous ones. Returns whether the latest version is
+        loaded and the bytes read
+        """
+        versions = self._repository.get_versions(str(base_path))
+        if not self._load_model(name, base_path, evict):
+            return False, 0
+        size = self._repository.get_model(str(base_path)).size
+        for version in versions[-self._served_versions.get(name, 1) : -1]:
+            if self._load_model(name, base_path, evict, version=version.number):
+                size += self._repository.get_model(str(base_path), version.number).size
+        return True, size
+
+    def _log_load_report(self, reports, total_time: float):
+        lines = [
+            f"  {name}: {'loaded' if loaded else 'not loaded'} in {load_time:.2f} s, "
+            f"{size / 1e6:.1f} MB read"
+            for name, loaded, load_time, size in reports
+        ]
+        loaded = sum(report[1] for report in reports)
+        logger.info(
+            f"{loaded} of {len(reports)} models loaded in {total_time:.2f} s, "
+            f"{sum(report[3] for report in reports) / 1e6:.1f} MB read, "
+            f"{self._available_memory:.0f} bytes of memory available:\n"
+            + "\n".join(lines)
+        )
+
+    def _load_model(
+        self, name: str, base_path: Path, evict: bool = False, version: int = None
+    ):
+        model_file = self._repository.get_model(str(base_path), version)
+        if model_file is not None:
+            path = model_file.path
+            self._base_paths[name] = base_path
 
-            # Load model
-            size = path.stat().st_size * self._memory_factor
-            if self._available_memory > (size - old_size):
+            # Reserve the estimated size, evicting idle models to make room if asked.
+            # The loaded version keeps serving requests until the new one replaces
+            # it, so both are part of the memory used meanwhile
+            estimated_size = model_file.size * self._memory_factor
+            with self._models_lock:
+                replacing = (
+                    name in self._models
+                    and self._models[name].state == model_pb2.ModelStatus.LOADED
+                )
+                if evict:
+                    self._evict_models(estimated_size, name)
+                enough_memory = self._available_memory > estimated_size
+                if enough_memory:
+                    self._available_memory -= estimated_size
+
+            # The shard processes keep the evicted models until forked again
+            if evict and self._shards is not None:
+                self._shards.invalidate()
+
+            # Load model, the estimated size is checked before loading it
+            if enough_memory:
                 try:
-                    self._models[name] = Model(
+                    ft_model, size = self._load_measured(path, estimated_size)
+                    vocabulary = (
+                        self._get_vocabulary(ft_model, path)
+                        if self._vocabulary_matrix
+                        else None
+                    )
+                    index = (
+                        self._get_index(vocabulary, path) if self._ann_index else None
+                    )
+                    self._warm_up(ft_model)
+
+                    # Their memory is not part of the file size estimation
+                    if self._measure_memory and vocabulary is not None:
+                        size += vocabulary.memory
+                    if self._measure_memory and index is not None:
+                        size += index.memory
+                    model = Model(
                         model_pb2.ModelSpec(
                             name=name,
                             base_path=str(base_path),
                             version=int(path.parent.name),
                         ),
-                        fasttext.load_model(str(path)),
+                        ft_model,
                         size,
                         model_pb2.ModelStatus.LOADED,
+                        self._get_label_table(ft_model),
+                        vocabulary,
+                        index,
+                        estimated_size,
                     )
-                    self._available_memory -= size - old_size
-                    logger.info(f"Model {name} loaded from {path}")
+                    with self._models_lock:
+                        self._available_memory -= size - estimated_size
+                        self._replace_model(name, model)
+                        served = set(self._served[name])
+                    if self._shards is not None:
+                        self._shards.invalidate()
+
+                    # Cached results of a reloaded version may be out of date
+                    version = model.pb_model.version
+                    if self._cache is not None:
+                        self._cache.invalidate(name, served - {version})
+                    if self._disk_cache is not None:
+                        self._disk_cache.drop_old_versions(name, served)
+                    logger.info(
+                        f"Model {name} loaded from {path}, using {size:.0f} bytes "
+                        f"(estimated {estimated_size:.0f})"
+                    )
+                    if self._available_memory < 0:
+                        logger.warning(
+                            f"Model {name} uses {-self._available_memory} bytes more "
+                            "than the available memory"
+                        )
                     return True
                 except Exception as ex:
                     logger.warning(f"Error loading model {name} from {path}: {ex}")
-                    self._models[name] = Model(
-                        None, None, None, state=model_pb2.ModelStatus.FAILED
-                    )
+                    with self._models_lock:
+                        self._available_memory += estimated_size
+                        if not replacing:
+                            self._models[name] = Model(
+                                None, None, None, state=model_pb2.ModelStatus.FAILED
+                            )
                     return False
 
             logger.warning(
                 f"Not enough available memory to load model {name} from {path}"
             )
-            self._models[name] = Model(
-                None, None, None, state=model_pb2.ModelStatus.AVAILABLE
-            )
+            if not replacing:
+                with self._models_lock:
+                    self._models[name] = Model(
+                        None, None, None, state=model_pb2.ModelStatus.AVAILABLE
+                    )
             return False
 
         logger.warning(f"Not model available in {base_path}")
         return False
 
+    def _warm_up(self, ft_model):
+        """
+        Predict a few sentences of vocabulary words, so the first requests to a new
+        model do not pay for its page faults
+        """
+        words = ft_model.get_words()[: self._warmup_sentences * 10]
+        sentences = [" ".join(words[i : i + 10]) for i in range(0, len(words), 10)]
+        if ft_model.f.getArgs().model.name == "supervised" and len(sentences) > 0:
+            ft_model.predict(sentences, k=1)
+        for sentence in sentences:
+            ft_model.get_sentence_vector(sentence)
+
+    def _replace_model(self, name: str, model: Model):
+        """
+        Serve a new version of a model along with the latest versions its policy
+        keeps, the latest one is used by default. The versions no longer served are
+        retired until the requests that may be using them finish. Called with the
+        models lock held
+        """
+        served = self._served[name]
+        version = model.pb_model.version
+        if version in served:
+            self._retire(name, served[version])
+        served[version] = model
+        while len(served) > self._served_versions.get(name, 1):
+            self._retire(name, served.pop(min(served)))
+        self._models[name] = served[max(served)]
+        self._release_retired(name)
+
+    def _retire(self, name: str, model: Model):
+        self._retired[name].append((self._generations[name], model))
+        self._generations[name] += 1
+
+    def _release_retired(self, name: str):
+        """
+        Free the retired versions of a model older than every request in progress.
+        Called with the models lock held
+        """
+        oldest = min(
+            self._generation_requests.get(name, ()), default=self._generations[name]
+        )
+        for generation, model in list(self._retired[name]):
+            if generation < oldest:
+                self._retired[name].remove((generation, model))
+                self._available_memory += model.size
+                logger.info(
+                    f"Version {model.pb_model.version} of model {name} unloaded, "
+                    "its requests finished"
+                )
+
+    @contextmanager
+    def _using_model(self, name: str):
+        """
+        Track a request in progress to a model, in the generation it started. The
+        counts are removed once they drop to zero, so requests to unknown model
+        names leave nothing behind
+        """
+        with self._models_lock:
+            generation = self._generations.get(name, 0)
+            self._in_flight[name] += 1
+            self._generation_requests[name][generation] += 1
+        try:
+            yield
+        finally:
+            with self._models_lock:
+                self._in_flight[name] -= 1
+                if self._in_flight[name] == 0:
+                    del self._in_flight[name]
+                requests = self._generation_requests[name]
+                requests[generation] -= 1
+                if requests[generation] == 0:
+                    del requests[generation]
+                    if len(requests) == 0:
+                        del self._generation_requests[name]
+                    if name in self._retired:
+                        self._release_retired(name)
+
+    def _evict_models(self, size, name: str):
+        """
+        Unload the least recently used models until there is room for the given
+        size. Pinned models, models with requests in progress and the model being
+        loaded are never evicted
+        """
+        candidates = sorted(
+            (
+                self._last_used.get(other, 0.0),
+                other,
+            )
+            for other, model in self._models.items()
+            if model.state == model_pb2.ModelStatus.LOADED
+            and other != name
+            and other not in self._pinned_models
+            and self._in_flight.get(other, 0) == 0
+        )
+        for _, other in candidates:
+            if self._available_memory > size:
+                break
+            self._available_memory += sum(
+                model.size for model in self._served.pop(other).values()
+            )
+            self._models[other] = Model(
+                None, None, None, state=model_pb2.ModelStatus.AVAILABLE
+            )
+            self._lazy_loading_stats[other][1] += 1
+            logger.info(f"Model {other} evicted to make room for model {name}")
+
+    def _load_on_demand(self, name: str):
+        """
+        Load an available model the first time it is requested. Concurrent requests
+        to the model wait for a single load
+        """
+        with self._models_lock:
+            self._lazy_loading_stats[name][2] += 1
+            lock = self._loading_locks.setdefault(name, Lock())
+        with lock:
+            if self._models[name].state != model_pb2.ModelStatus.AVAILABLE:
+                return
+            with self._loads_semaphore:
+                loaded, _ = self._load_served_versions(
+                    name, self._base_paths[name], evict=True
+                )
+                if loaded:
+                    with self._models_lock:
+                        self._lazy_loading_stats[name][0] += 1
+
+    def _load_measured(self, path: Path, estimated_size):
+        """
+        Load a fastText model, measuring its memory if no other load is measured
+        meanwhile, as both would be part of the growth of the resident set size
+        """
+        if not self._measure_memory or not self._measure_lock.acquire(blocking=False):
+            return fasttext.load_model(str(path)), estimated_size
+        try:
+            rss = get_rss()
+            ft_model = fasttext.load_model(str(path))
+            return ft_model, self._get_measured_size(rss, estimated_size)
+        finally:
+            self._measure_lock.release()
+
+    @staticmethod
+    def _get_measured_size(rss_before, estimated_size) -> int:
+        """
+        Memory used by a model as the growth of the resident set size while loading
+        it, or the estimated size if it cannot be measured
+        """
+        rss = get_rss()
+        if rss_before is None or rss is None or rss <= rss_before:
+            return estimated_size
+        return rss - rss_before
+
     def load_models(
         self, request: service_pb2.LoadModelsRequest
     ) -> service_pb2.LoadModelsResponse:
         # Check missing args
         if len(request.models) == 0:
             raise MissingArgumentException("Missing argument")
+        self._check_loading()
 
         success = True
         for model in request.models:
@@ -136,40 +548,250 @@ class FastTextService(object):
                     model.name not in self._models
                     or self._models[model.name].state != model_pb2.ModelStatus.LOADED
                 ):
+                    self._repository.scan(model.base_path)
                     self._load_model(model.name, Path(model.base_path))
                 success = self._models[model.name].state == model_pb2.ModelStatus.LOADED
 
         return service_pb2.LoadModelsResponse(success=success)
 
+    @_tracks_requests
     def predict(
         self, request: service_pb2.PredictRequest
     ) -> service_pb2.PredictResponse:
 
-        # Check args
+        # Check args, k is checked here so allowed labels do not skip fastText's check
         self._check_args(request)
         self._check_model(request.model_name)
+        model = self._get_model(request.model_name, request.version)
+        self._get_label_ids(model, request.labels)
+        if request.k == 0 or request.k < -1:
+            raise MissingArgumentException("k needs to be 1 or higher, or -1 for all")
+        parameters = (request.k, request.threshold, tuple(request.labels))
+
+        # The version is resolved once, so a swap during the request does not mix
+        # the predictions or cached results of two versions
+        version = model.pb_model.version
+
+        # Predict every distinct sentence once
+        sentences, positions = self._deduplicate(request.model_name, request.batch)
 
         # Call FastText model
-        try:
-            labels, scores = self._models[request.model_name].ft_model.predict(
-                text=list(request.batch), k=request.k
+        if request.packed:
+            model, labels, scores = self._call_predict(
+                request.model_name, sentences, version, *parameters
+            )
+            if positions is not None:
+                labels = [labels[i] for i in positions]
+                scores = [scores[i] for i in positions]
+            return service_pb2.PredictResponse(
+                model=model.pb_model,
+                packed_predictions=self._pack_predictions(model, labels, scores),
             )
-        except Exception as ex:
-            raise FastTextException(ex)
 
-        # Generate response
+        # Skip the cached sentences, first in memory and then on disk
+        if self._cache is not None or self._disk_cache is not None:
+            compute = lambda sentences: self._get_predictions(
+                request.model_name, sentences, version, *parameters
+            )[1]
+            if self._disk_cache is not None:
+                compute = partial(
+                    self._disk_cache.get_or_compute,
+                    request.model_name,
+                    version,
+                    "predict",
+                    parameters,
+                    compute_fn=compute,
+                    encode=model_pb2.Prediction.SerializeToString,
+                    decode=model_pb2.Prediction.FromString,
+                )
+            if self._cache is not None:
+                predictions = self._cache.get_or_compute(
+                    request.model_name,
+                    version,
+                    parameters,
+                    sentences,
+                    compute,
+                )
+            else:
+                predictions = compute(sentences)
+        else:
+            model, predictions = self._get_predictions(
+                request.model_name, sentences, version, *parameters
+            )
+        if positions is not None:
+            predictions = [predictions[i] for i in positions]
+
+        return service_pb2.PredictResponse(
+            model=model.pb_model, predictions=predictions
+        )
+
+    def predict_stream(self, requests):
+        # Requests are read one at a time, so gRPC flow control stops the client
+        # from sending more chunks than the service is able to predict
+        for request in requests:
+            yield self.predict(request)
+
+    def _get_predictions(self, model_name: str, sentences: list, *parameters):
+        model, labels, scores = self._call_predict(model_name, sentences, *parameters)
+
+        # Generate predictions
+        names, ids = model.labels.names, model.labels.ids
         predictions = []
         for k_labels, k_scores in zip(labels, scores):
             prediction = model_pb2.Prediction(
-                labels=[label.replace("__label__", "") for label in k_labels],
+                labels=[names[ids[label]] for label in k_labels],
                 scores=k_scores.astype(float),
             )
             predictions.append(prediction)
+        return model, predictions
 
-        return service_pb2.PredictResponse(
-            model=self._models[request.model_name].pb_model, predictions=predictions
+    def _deduplicate(self, model_name: str, batch):
+        """
+        Get the distinct elements of a batch and the position of each element of the
+        batch among them, or None if there are no duplicates
+        """
+        positions = {}
+        indices = [positions.setdefault(item, len(positions)) for item in batch]
+        duplicates = len(indices) - len(positions)
+        if duplicates == 0:
+            return list(batch), None
+
+        logger.debug(f"Found {duplicates} duplicates in a request to {model_name}")
+        with self._duplicates_lock:
+            self._duplicates[model_name] += duplicates
+        return list(positions), indices
+
+    def _call_predict(self, model_name: str, sentences: list, *parameters):
+        if self._batcher is not None:
+            return self._batcher.predict(model_name, sentences, *parameters)
+        return self._predict(model_name, sentences, *parameters)
+
+    @staticmethod
+    def _pack_predictions(model, labels, scores) -> model_pb2.PackedPredictions:
+        names, ids = model.labels.names, model.labels.ids
+        width = max((len(k_labels) for k_labels in labels), default=0)
+        size = len(labels) * width
+
+        if all(len(k_labels) == width for k_labels in labels):
+            indices = np.fromiter(
+                (ids[label] for k_labels in labels for label in k_labels),
+                dtype="<i4",
+                count=size,
+            )
+            packed_scores = np.asarray(scores, dtype="<f4").reshape(size)
+        else:
+            # Pad the predictions with less labels than the widest one
+            indices = np.full((len(labels), width), -1, dtype="<i4")
+            packed_scores = np.zeros((len(labels), width), dtype="<f4")
+            for row, (k_labels, k_scores) in enumerate(zip(labels, scores)):
+                indices[row, : len(k_labels)] = [ids[label] for label in k_labels]
+                packed_scores[row, : len(k_scores)] = k_scores
+
+        return model_pb2.PackedPredictions(
+            labels=names,
+            k=width,
+            label_indices=indices.tobytes(),
+            scores=packed_scores.tobytes(),
         )
 
+    @staticmethod
+    def _get_label_table(ft_model) -> LabelTable:
+        labels = tuple(ft_model.get_labels())
+        names = tuple(sys.intern(label.replace("__label__", "")) for label in labels)
+        return LabelTable(
+            names=names,
+            ft_labels=labels,
+            ids={label: index for index, label in enumerate(labels)},
+            name_ids={name: index for index, name in enumerate(names)},
+        )
+
+    @staticmethod
+    def _get_label_ids(model, labels):
+        try:
+            return np.array(
+                [model.labels.name_ids[label] for label in labels], dtype=int
+            )
+        except KeyError as ex:
+            raise MissingArgumentException(f"Unknown label {ex}")
+
+    def _predict(
+        self,
+        model_name: str,
+        sentences: list,
+        version: int,
+        k: int,
+        threshold: float = 0.0,
+        labels: tuple = (),
+    ):
+        self._check_model(model_name)
+        model = self._get_model(model_name, version, retired=True)
+        label_ids = self._get_label_ids(model, labels)
+
+        # The allowed labels are filtered from the full probability vector
+        ft_k = -1 if len(label_ids) > 0 else k
+        try:
+            predictions = None
+            if self._shards is not None:
+                predictions = self._shards.predict(
+                    model_name, model.pb_model.version, sentences, ft_k, threshold
+                )
+            if predictions is None:
+                predictions = model.ft_model.predict(
+                    text=sentences, k=ft_k, threshold=threshold
+                )
+            ft_labels, scores = predictions
+        except Exception as ex:
+            raise FastTextException(ex)
+
+        if len(label_ids) > 0:
+            ft_labels, scores = self._filter_labels(
+                model, ft_labels, scores, label_ids, k
+            )
+        return model, ft_labels, scores
+
+    def _get_ft_models(self) -> dict:
+        with self._models_lock:
+            return {
+                (name, version): model.ft_model
+                for name, served in self._served.items()
+                for version, model in served.items()
+            }
+
+    @staticmethod
+    def _filter_labels(model, ft_labels, scores, label_ids, k: int):
+        """
+        Keep the top k of the allowed labels of each prediction
+        """
+        rows = len(ft_labels)
+        counts = np.fromiter((len(k_labels) for k_labels in ft_labels), int, rows)
+        columns = np.fromiter(
+            (model.labels.ids[label] for k_labels in ft_labels for label in k_labels),
+            int,
+            counts.sum(),
+        )
+
+        # Scatter the scores in a batch x labels matrix, -1 for scores under threshold
+        probabilities = np.full((rows, len(model.labels.names)), -1.0, dtype=np.float32)
+        if rows > 0 and columns.size > 0:
+            probabilities[np.repeat(np.arange(rows), counts), columns] = np.concatenate(
+                scores
+            )
+
+        # Sort the allowed labels by score
+        allowed = probabilities[:, label_ids]
+        order = np.argsort(-allowed, axis=1, kind="stable")
+        if k > 0:
+            order = order[:, :k]
+        top_scores = np.take_along_axis(allowed, order, axis=1)
+        top_ids = label_ids[order]
+
+        filtered_labels, filtered_scores = [], []
+        for row_ids, row_scores in zip(top_ids, top_scores):
+            valid = row_scores >= 0
+            filtered_labels.append([model.labels.ft_labels[i] for i in row_ids[valid]])
+            filtered_scores.append(row_scores[valid])
+        return filtered_labels, filtered_scores
+
     def get_loaded_models(self) -> service_pb2.LoadedModelsResponse:
         loaded_models = []
         for model in self._models.values():
@@ -188,90 +810,391 @@ class FastTextService(object):
                     status=model_pb2.ModelStatus(state=model_pb2.ModelStatus.UNKWOWN)
                 )
             if self._models[request.model.name].state == model_pb2.ModelStatus.LOADED:
-                return service_pb2.ModelStatusResponse(
-                    status=model_pb2.ModelStatus(
-                        state=self._models[request.model.name].state,
-                        version=self._models[request.model.name].pb_model.version,
-                    )
+                status = model_pb2.ModelStatus(
+                    state=self._models[request.model.name].state,
+                    version=self._models[request.model.name].pb_model.version,
+                    duplicates=self._duplicates[request.model.name],
+                    memory=model_pb2.MemoryStats(
+                        measured=int(self._models[request.model.name].size),
+                        estimated=int(self._models[request.model.name].estimated_size),
+                        retired=int(
+                            sum(
+                                model.size
+                                for _, model in self._retired[request.model.name]
+                            )
+                        ),
+                    ),
                 )
-            return service_pb2.ModelStatusResponse(
-                status=model_pb2.ModelStatus(
+                status.served_versions.extend(sorted(self._served[request.model.name]))
+                vocabulary = self._models[request.model.name].vocabulary
+                if vocabulary is not None:
+                    status.vocabulary.CopyFrom(
+                        model_pb2.VocabularyStats(
+                            words=len(vocabulary.rows),
+                            memory=vocabulary.memory,
+                            load_time=vocabulary.load_time,
+                        )
+                    )
+                if self._batcher is not None:
+                    status.batching.CopyFrom(
+                        self._batcher.get_stats(request.model.name)
+                    )
+                if self._cache is not None:
+                    status.cache.CopyFrom(self._cache.get_stats(request.model.name))
+                if self._disk_cache is not None:
+                    status.disk_cache.CopyFrom(
+                        self._disk_cache.get_stats(request.model.name)
+                    )
+            else:
+                status = model_pb2.ModelStatus(
                     state=self._models[request.model.name].state
                 )
-            )
-
-    def _handle_file_update(self, updated_path):
-        if updated_path.is_file():
-            base_path = updated_path.parent.parent
-            if str(base_path) in self._configured_models:
-                model_path = self._get_latest_version_path(base_path)
-                if model_path is not None:
-                    model_name = self._configured_models[str(base_path)]
-                    logger.info(
-                        f"Model {model_name}'s base_path {base_path} has been modified."
+            if request.model.name in self._base_paths:
+                base_path = str(self._base_paths[request.model.name])
+                status.versions.extend(
+                    version.number
+                    for version in self._repository.get_versions(base_path)
+                )
+            if self._lazy_loading:
+                loads, evictions, misses = self._lazy_loading_stats[request.model.name]
+                status.lazy_loading.CopyFrom(
+                    model_pb2.LazyLoadingStats(
+                        loads=loads, evictions=evictions, misses=misses
                     )
+                )
+            return service_pb2.ModelStatusResponse(status=status)
 
-                    # Wait until model size hasn't changed for 1 second
-                    while True:
-                        prev_size = model_path.stat().st_size
-                        time.sleep(1)
-                        now_size = model_path.stat().st_size
-                        if now_size == prev_size:
-                            self._load_model(model_name, base_path)
-                            break
-
-    @staticmethod
-    def _get_latest_version_path(base_path: Path) -> Path:
-        if base_path.is_dir():
-
-            # Get version directory with the highest name
-            versions = [entry.name for entry in base_path.iterdir() if entry.is_dir()]
-            if len(versions) == 0:
-                return None
-            latest_version_dir = base_path / max(versions)
-
-            # Search for a .bin or .ftz file inside it
-            files = list(latest_version_dir.glob("*.bin")) + list(
-                latest_version_dir.glob("*.ftz")
+    def _reload_model(self, base_path: str):
+        model_name = self._configured_models.get(base_path)
+        if model_name is not None:
+            logger.info(
+                f"Model {model_name}'s base_path {base_path} has been modified."
             )
-            if len(list(files)) == 1:
-                return files[0]
 
-        return None
+            # The loaded version serves requests meanwhile
+            self._reload_pool.submit(self._reload_version, model_name, Path(base_path))
+
+    def _reload_version(self, name: str, base_path: Path):
+        if self._load_model(name, base_path) and self._on_reload is not None:
+            self._on_reload()
 
+    @_tracks_requests
     def get_words_vectors(
         self, request: service_pb2.VectorsRequest
     ) -> service_pb2.VectorsResponse:
 
         # Check args
         self._check_args(request)
+        check_encoding(request.encoding)
         self._check_model(request.model_name)
 
-        # Generate response
+        # Get the vector of every distinct word once
+        words, positions = self._deduplicate(request.model_name, request.batch)
+        model = self._get_model(request.model_name, request.version)
         try:
-            vectors = []
-            for word in request.batch:
-                vectors.append(
-                    model_pb2.WordVector(
-                        element=list(
-                            self._models[request.model_name].ft_model.get_word_vector(
-                                word
-                            )
-                        )
-                    )
-                )
-            response = service_pb2.VectorsResponse(
-                model=self._models[request.model_name].pb_model, vectors=vectors
+            vectors = self._get_word_vectors(model, words)
+        except Exception as ex:
+            raise FastTextException(ex)
+        if positions is not None:
+            vectors = vectors[positions]
+
+        # Generate response
+        if request.packed or request.encoding != model_pb2.Matrix.FLOAT32:
+            return service_pb2.VectorsResponse(
+                model=model.pb_model, matrix=pack_matrix(vectors, request.encoding)
             )
+        return service_pb2.VectorsResponse(
+            model=model.pb_model,
+            vectors=[model_pb2.WordVector(element=vector) for vector in vectors],
+        )
+
+    @_tracks_requests
+    def get_sentence_vectors(
+        self, request: service_pb2.SentenceVectorsRequest
+    ) -> service_pb2.SentenceVectorsResponse:
+
+        # Check args
+        self._check_args(request)
+        check_encoding(request.encoding)
+        self._check_model(request.model_name)
+
+        # Get the vector of every distinct text once, fastText rejects newlines
+        texts, positions = self._deduplicate(request.model_name, request.batch)
+        model = self._models[request.model_name]
+        if self._disk_cache is not None:
+            vectors = np.array(
+                self._disk_cache.get_or_compute(
+                    request.model_name,
+                    model.pb_model.version,
+                    "sentence_vectors",
+                    (),
+                    texts,
+                    partial(self._get_sentence_vectors, model),
+                    encode=np.ndarray.tobytes,
+                    decode=partial(np.frombuffer, dtype=np.float32),
+                ),
+                dtype=np.float32,
+            ).reshape(len(texts), model.ft_model.get_dimension())
+        else:
+            vectors = self._get_sentence_vectors(model, texts)
+        if positions is not None:
+            vectors = vectors[positions]
+
+        return service_pb2.SentenceVectorsResponse(
+            model=model.pb_model,
+            matrix=pack_matrix(vectors, request.encoding),
+            invalid=[i for i, text in enumerate(request.batch) if "\n" in text],
+        )
+
+    @staticmethod
+    def _get_sentence_vectors(model, texts: list) -> np.ndarray:
+        vectors = np.zeros(
+            (len(texts), model.ft_model.get_dimension()), dtype=np.float32
+        )
+        try:
+            for row, text in enumerate(texts):
+                if "\n" not in text:
+                    vectors[row] = model.ft_model.get_sentence_vector(text)
         except Exception as ex:
             raise FastTextException(ex)
-        return response
+        return vectors
+
+    @staticmethod
+    def _get_word_vectors(model, words: list) -> np.ndarray:
+        if model.vocabulary is None:
+            vectors = np.empty(
+                (len(words), model.ft_model.get_dimension()), dtype=np.float32
+            )
+            for row, word in enumerate(words):
+                vectors[row] = model.ft_model.get_word_vector(word)
+            return vectors
+
+        # Gather the vocabulary words, only the rest are built from their subwords
+        rows = FastTextService._get_rows(model.vocabulary, words)
+        vectors = model.vocabulary.matrix[rows]
+        for row in np.flatnonzero(rows < 0):
+            vectors[row] = model.ft_model.get_word_vector(words[row])
+        return vectors
+
+    def _get_vocabulary(self, ft_model, path: Path) -> Vocabulary:
+        start = time.time()
+        store = self._get_store(ft_model, path) if self._embedding_store else None
+        if store is not None:
+            # Memory-mapped, so it is not held by this process
+            words, rows, matrix, memory = store, store, store.matrix, 0
+        else:
+            words, matrix = self._get_vocabulary_matrix(ft_model)
+            rows = {word: row for row, word in enumerate(words)}
+            memory = (
+                matrix.nbytes
+                + sys.getsizeof(rows)
+                + sum(sys.getsizeof(word) for word in words)
+            )
+
+        # L2-normalized vectors, so cosine similarity is a dot product
+        normalized = None
+        if self._nearest_neighbors:
+            normalized = normalize(matrix)
+            memory += normalized.nbytes
+
+        return Vocabulary(words, rows, matrix, normalized, memory, time.time() - start)
+
+    @staticmethod
+    def _get_vocabulary_matrix(ft_model):
+        words = ft_model.get_words()
+        if not ft_model.is_quantized() and ft_model.f.getArgs().maxn == 0:
+            # Without subwords the vector of a word is its row of the input matrix
+            matrix = ft_model.get_input_matrix()[: len(words)].copy()
+        else:
+            matrix = np.empty((len(words), ft_model.get_dimension()), dtype=np.float32)
+            for row, word in enumerate(words):
+                matrix[row] = ft_model.get_word_vector(word)
+        return words, matrix
+
+    @staticmethod
+    def _get_store(ft_model, path: Path) -> EmbeddingStore:
+        """
+        Memory-map the store exported in the version directory of the model, or
+        export it if it does not exist yet. Returns None if it cannot be exported
+        """
+        store_path = path.with_suffix(".vectors")
+        if FastTextService._is_up_to_date(store_path, path):
+            store = EmbeddingStore.load(
+                store_path, len(ft_model.get_words()), ft_model.get_dimension()
+            )
+            if store is not None:
+                logger.info(f"Vectors of {path} loaded from {store_path}")
+                return store
+
+        try:
+            FastTextService._remove_stale(store_path, path)
+            EmbeddingStore.export(
+                store_path, *FastTextService._get_vocabulary_matrix(ft_model)
+            )
+        except OSError as ex:
+            logger.warning(f"Vectors of {path} not exported to {store_path}: {ex}")
+            return None
+        logger.info(f"Vectors of {path} exported to {store_path}")
+        return EmbeddingStore.load(
+            store_path, len(ft_model.get_words()), ft_model.get_dimension()
+        )
+
+    @staticmethod
+    def _is_up_to_date(saved_path: Path, path: Path) -> bool:
+        """
+        Whether a file saved next to a model exists and is newer than the model
+        """
+        return (
+            saved_path.exists() and saved_path.stat().st_mtime >= path.stat().st_mtime
+        )
+
+    @staticmethod
+    def _remove_stale(saved_path: Path, path: Path):
+        """
+        Remove a directory saved next to a model if it is older than the model. It
+        is moved aside first, so it is never seen half removed
+        """
+        if saved_path.exists() and not FastTextService._is_up_to_date(saved_path, path):
+            trash_path = Path(tempfile.mkdtemp(prefix=".", dir=saved_path.parent))
+            try:
+                saved_path.rename(trash_path / saved_path.name)
+            except FileNotFoundError:
+                pass
+            shutil.rmtree(trash_path, ignore_errors=True)
+
+    @staticmethod
+    def _get_rows(vocabulary: Vocabulary, words) -> np.ndarray:
+        """
+        Get the vocabulary row of every word, or -1 if it is not in the vocabulary
+        """
+        if isinstance(vocabulary.rows, EmbeddingStore):
+            return vocabulary.rows.lookup(words)
+        return np.fromiter(
+            (vocabulary.rows.get(word, -1) for word in words), int, len(words)
+        )
+
+    def _get_index(self, vocabulary: Vocabulary, path: Path) -> IVFIndex:
+        """
+        Memory-map the index saved in the version directory of the model, or build
+        and save it if it does not exist yet. It is served from memory if it cannot
+        be saved
+        """
+        index_path = path.with_suffix(".ivf")
+        index = None
+        if self._is_up_to_date(index_path, path):
+            index = IVFIndex.load(index_path, *vocabulary.matrix.shape)
+        if index is not None:
+            logger.info(f"Index of {path} loaded from {index_path}")
+            return index
+
+        start = time.time()
+        normalized = vocabulary.normalized
+        if normalized is None:
+            normalized = normalize(vocabulary.matrix)
+        index = IVFIndex.build(normalized, self._ann_lists, self._ann_iterations)
+        logger.info(f"Index of {path} built in {time.time() - start:.2f} seconds")
+        try:
+            self._remove_stale(index_path, path)
+            index.save(index_path)
+        except OSError as ex:
+            logger.warning(f"Index of {path} not saved to {index_path}: {ex}")
+            return index
+        saved = IVFIndex.load(index_path, *vocabulary.matrix.shape)
+        return index if saved is None else saved
+
+    @_tracks_requests
+    def get_nearest_neighbors(
+        self, request: service_pb2.NearestNeighborsRequest
+    ) -> service_pb2.NearestNeighborsResponse:
+
+        # Check args
+        if request.model_name == "" or (
+            len(request.batch) == 0 and request.vectors.rows == 0
+        ):
+            raise MissingArgumentException("Missing argument")
+        self._check_model(request.model_name)
+        model = self._models[request.model_name]
+        if (request.approximate and model.index is None) or (
+            not request.approximate
+            and (model.vocabulary is None or model.vocabulary.normalized is None)
+        ):
+            raise NotEnabledException(
+                f"{'Approximate n' if request.approximate else 'N'}earest neighbors "
+                f"not enabled for model {request.model_name}"
+            )
+
+        # Get the query vectors, the query words are not their own neighbors
+        dimension = model.ft_model.get_dimension()
+        if len(request.batch) > 0:
+            try:
+                queries = self._get_word_vectors(model, list(request.batch))
+            except Exception as ex:
+                raise FastTextException(ex)
+            excluded = self._get_rows(model.vocabulary, request.batch)
+        else:
+            if request.vectors.columns != dimension:
+                raise MissingArgumentException(f"Vectors must have {dimension} columns")
+            try:
+                queries = unpack_matrix(request.vectors)
+            except ValueError as ex:
+                raise MissingArgumentException(str(ex))
+            excluded = None
+
+        k = request.k if request.k > 0 else 10
+        if request.approximate:
+            probes = request.probes if request.probes > 0 else self._ann_probes
+            ids, scores = model.index.search(normalize(queries), k, probes, excluded)
+        else:
+            ids, scores = search_exact(
+                model.vocabulary.normalized, normalize(queries), k, excluded
+            )
+        words = model.vocabulary.words
+        return service_pb2.NearestNeighborsResponse(
+            model=model.pb_model,
+            neighbors=[
+                model_pb2.Neighbors(
+                    words=[words[i] for i in row_ids], scores=row_scores
+                )
+                for row_ids, row_scores in zip(ids, scores)
+            ],
+        )
 
     def _check_model(self, model_name):
         if model_name not in self._models:
             raise ModelNotLoadedException(f"Unknown model {model_name}")
+        if (
+            self._lazy_loading
+            and self._loads_models
+            and self._models[model_name].state == model_pb2.ModelStatus.AVAILABLE
+        ):
+            self._load_on_demand(model_name)
         if self._models[model_name].state != model_pb2.ModelStatus.LOADED:
             raise ModelNotLoadedException(f"Model {model_name} not loaded")
+        self._last_used[model_name] = time.monotonic()
+
+    def _get_model(self, model_name, version: int = 0, retired: bool = False) -> Model:
+        """
+        Get the latest version of a checked model, or the given version if it is
+        served. A retired version is also returned if asked, for the requests that
+        resolved it before it was replaced
+        """
+        if version == 0:
+            return self._models[model_name]
+        model = self._served[model_name].get(version)
+        if model is None and retired:
+            model = next(
+                (
+                    model
+                    for _, model in reversed(self._retired.get(model_name, []))
+                    if model.pb_model.version == version
+                ),
+                None,
+            )
+        if model is None:
+            raise ModelNotLoadedException(
+                f"Version {version} of model {model_name} not served"
+            )
+        return model
 
     @staticmethod
     def _check_args(request):
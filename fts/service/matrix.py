@@ -0,0 +1,77 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+from fts.protos import model_pb2
+from fts.service.exceptions import MissingArgumentException
+
+_DTYPES = {
+    model_pb2.Matrix.FLOAT32: "<f4",
+    model_pb2.Matrix.FLOAT16: "<f2",
+    model_pb2.Matrix.INT8: "i1",
+}
+
+
+def check_encoding(encoding):
+    if encoding not in _DTYPES:
+        raise MissingArgumentException(f"Unknown matrix encoding {encoding}")
+
+
+def pack_matrix(
+    vectors: np.ndarray, encoding=model_pb2.Matrix.FLOAT32
+) -> model_pb2.Matrix:
+    """
+    Pack the vectors in a matrix message. With INT8 encoding every row is scaled
+    by its maximum absolute value, sent as a float32 per row
+    """
+    if encoding == model_pb2.Matrix.INT8:
+        scales = np.abs(vectors).max(axis=1, initial=0.0).astype("<f4") / 127
+        divisors = np.where(scales > 0, scales, 1)[:, np.newaxis]
+        data = np.rint(vectors / divisors).astype("i1")
+        return model_pb2.Matrix(
+            rows=vectors.shape[0],
+            columns=vectors.shape[1],
+            encoding=encoding,
+            data=data.tobytes(),
+            scales=scales.tobytes(),
+        )
+
+    return model_pb2.Matrix(
+        rows=vectors.shape[0],
+        columns=vectors.shape[1],
+        encoding=encoding,
+        data=vectors.astype(_DTYPES[encoding], copy=False).tobytes(),
+    )
+
+
+def unpack_matrix(matrix: model_pb2.Matrix) -> np.ndarray:
+    """
+    Decode a matrix message as float32 vectors. Raises ValueError if its data does
+    not match its shape and encoding
+    """
+    if matrix.encoding not in _DTYPES:
+        raise ValueError(f"Unknown matrix encoding {matrix.encoding}")
+    dtype = np.dtype(_DTYPES[matrix.encoding])
+    if len(matrix.data) != dtype.itemsize * matrix.rows * matrix.columns:
+        raise ValueError(f"Data does not match a {matrix.rows}x{matrix.columns} matrix")
+    vectors = np.frombuffer(matrix.data, dtype=dtype).reshape(
+        matrix.rows, matrix.columns
+    )
+    if matrix.encoding == model_pb2.Matrix.INT8:
+        if len(matrix.scales) != 4 * matrix.rows:
+            raise ValueError("Missing the scale of every row")
+        scales = np.frombuffer(matrix.scales, dtype="<f4")
+        return vectors * scales[:, np.newaxis]
+    return vectors.astype(np.float32)
@@ -0,0 +1,190 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+
+import numpy as np
+
+from fts.service.store import save_directory
+
+# Vocabulary rows multiplied at once when searching nearest neighbors
+_BLOCK_SIZE = 65536
+
+# Vectors sampled per cluster to train the k-means of an index
+_SAMPLES_PER_LIST = 256
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize the rows, so cosine similarity is a dot product
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+def search_exact(normalized: np.ndarray, queries: np.ndarray, k: int, excluded=None):
+    """
+    Exact top k cosine similarity, multiplying the whole batch of queries by a
+    block of the vocabulary at a time. The excluded row of each query, if any,
+    is never returned, so that query has one neighbor less when k covers the
+    whole vocabulary
+    """
+    k = min(k, normalized.shape[0])
+    best_ids = np.empty((len(queries), 0), dtype=int)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for start in range(0, normalized.shape[0], _BLOCK_SIZE):
+        block = normalized[start : start + _BLOCK_SIZE]
+        similarities = queries @ block.T
+        if excluded is not None:
+            rows = np.flatnonzero((excluded >= start) & (excluded < start + len(block)))
+            similarities[rows, excluded[rows] - start] = -np.inf
+
+        # Keep the top k of the block and the previous ones
+        block_k = min(k, len(block))
+        top = np.argpartition(-similarities, block_k - 1, axis=1)[:, :block_k]
+        best_ids = np.concatenate([best_ids, top + start], axis=1)
+        best_scores = np.concatenate(
+            [best_scores, np.take_along_axis(similarities, top, axis=1)], axis=1
+        )
+        if best_ids.shape[1] > k:
+            top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_ids = np.take_along_axis(best_ids, top, axis=1)
+            best_scores = np.take_along_axis(best_scores, top, axis=1)
+
+    # Sort the neighbors of each query by similarity
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    best_ids = np.take_along_axis(best_ids, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    if excluded is not None and k == normalized.shape[0]:
+        # The excluded row is the last neighbor of its query
+        counts = np.where(excluded >= 0, k - 1, k)
+        best_ids = [ids[:count] for ids, count in zip(best_ids, counts)]
+        best_scores = [scores[:count] for scores, count in zip(best_scores, counts)]
+    return best_ids, best_scores
+
+
+class IVFIndex(object):
+    """
+    Inverted file index of normalized vectors. The vectors are clustered with
+    spherical k-means and stored grouped by cluster, so a query is only compared
+    with the vectors of its closest clusters (probes)
+    """
+
+    FILES = ("centroids", "offsets", "ids", "vectors")
+
+    def __init__(self, centroids, offsets, ids, vectors):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.vectors = vectors
+
+    @property
+    def memory(self) -> int:
+        """
+        Bytes held in memory, the ids and vectors are memory-mapped once loaded
+        """
+        return sum(
+            getattr(self, name).nbytes
+            for name in self.FILES
+            if not isinstance(getattr(self, name), np.memmap)
+        )
+
+    @classmethod
+    def build(cls, normalized: np.ndarray, lists: int = 0, iterations: int = 10):
+        rows = normalized.shape[0]
+        if lists <= 0:
+            lists = int(np.sqrt(rows))
+        lists = max(1, min(lists, rows))
+
+        # Train the centroids on a sample of the vectors
+        random = np.random.default_rng(0)
+        sample_size = min(rows, lists * _SAMPLES_PER_LIST)
+        sample = normalized[np.sort(random.choice(rows, sample_size, replace=False))]
+        centroids = sample[random.choice(sample_size, lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+
+            # Clusters left empty restart from a random vector of the sample
+            empty = np.flatnonzero(np.bincount(assignments, minlength=lists) == 0)
+            sums[empty] = sample[random.choice(sample_size, len(empty))]
+            centroids = normalize(sums)
+
+        # Group every vector by its closest centroid
+        assignments = np.concatenate(
+            [
+                np.argmax(normalized[start : start + _BLOCK_SIZE] @ centroids.T, axis=1)
+                for start in range(0, rows, _BLOCK_SIZE)
+            ]
+        )
+        ids = np.argsort(assignments, kind="stable").astype(np.int64)
+        offsets = np.zeros(lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignments, minlength=lists))
+        return cls(centroids, offsets, ids, normalized[ids])
+
+    def save(self, path: Path):
+        """
+        Write the index as .npy files in a directory
+        """
+        with save_directory(path) as tmp_path:
+            for name in self.FILES:
+                np.save(tmp_path / f"{name}.npy", getattr(self, name))
+
+    @classmethod
+    def load(cls, path: Path, rows: int, columns: int):
+        """
+        Memory-map a saved index, or return None if it does not exist or does not
+        match the shape of the vocabulary
+        """
+        if not all((path / f"{name}.npy").is_file() for name in cls.FILES):
+            return None
+        index = cls(
+            *(np.load(path / f"{name}.npy", mmap_mode="r") for name in cls.FILES)
+        )
+        if index.vectors.shape != (rows, columns) or index.offsets[-1] != rows:
+            return None
+        index.centroids = np.array(index.centroids)
+        index.offsets = np.array(index.offsets)
+        return index
+
+    def search(self, queries: np.ndarray, k: int, probes: int, excluded=None):
+        """
+        Approximate top k cosine similarity of normalized queries. Returns the ids
+        and scores of each query, with less than k neighbors if the probed clusters
+        do not have enough vectors
+        """
+        probes = max(1, min(probes, len(self.centroids)))
+        closest = np.argpartition(-(queries @ self.centroids.T), probes - 1, axis=1)
+        results_ids, results_scores = [], []
+        for row, query in enumerate(queries):
+            lists = [
+                slice(self.offsets[i], self.offsets[i + 1])
+                for i in closest[row, :probes]
+            ]
+            ids = np.concatenate([self.ids[rows] for rows in lists])
+            scores = np.concatenate([self.vectors[rows] @ query for rows in lists])
+            if excluded is not None and excluded[row] >= 0:
+                keep = ids != excluded[row]
+                ids, scores = ids[keep], scores[keep]
+
+            # Sort the top k candidates by similarity
+            top = np.arange(len(scores))
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            results_ids.append(ids[top])
+            results_scores.append(scores[top])
+        return results_ids, results_scores
@@ -0,0 +1,152 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+from collections import namedtuple
+from pathlib import Path
+from threading import Lock
+
+# Files of a version with the model, the rest are other artifacts like markers
+MODEL_SUFFIXES = (".bin", ".ftz")
+
+# A numeric version directory and the size and mtime of each of its files
+Version = namedtuple("Version", "number path files")
+Artifact = namedtuple("Artifact", "path size mtime")
+
+
+class ModelRepository(object):
+    """
+    Index of the versions published in the base path of every model: the version
+    directories with a numeric name, sorted by number, and the size and mtime of
+    the files in each of them. A base path is scanned when it is first used, and
+    then only the versions changed are scanned again, so finding the latest
+    version does not list every version directory
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._versions = {}  # base path: versions in ascending order
+        self._listings = {}  # base path: resolved path and mtime when it was listed
+
+    def scan(self, base_path: str):
+        """
+        List the version directories of a base path and the files of each one
+        """
+        key = os.path.normpath(base_path)
+        listing = self._get_listing(key)
+        versions = []
+        if listing is not None:
+            for name in self._list_versions(key):
+                version = self._scan_version(key, name)
+                if version is not None:
+                    versions.append(version)
+            versions.sort(key=lambda version: version.number)
+        with self._lock:
+            self._versions[key] = versions
+            self._listings[key] = listing
+
+    def update(self, base_path: str, paths):
+        """
+        Scan again the versions of a base path with changed paths, or the whole
+        base path if it has been replaced or one of its parents changed
+        """
+        key = os.path.normpath(base_path)
+        names = set()
+        for path in paths:
+            parts = Path(os.path.relpath(os.path.normpath(path), key)).parts
+            if len(parts) == 0 or parts[0] == "..":
+                return self.scan(key)
+            if parts[0].isdigit():
+                names.add(parts[0])
+        if key not in self._versions:
+            return self.scan(key)
+
+        for name in names:
+            version = self._scan_version(key, name)
+            with self._lock:
+                versions = [old for old in self._versions[key] if old.path.name != name]
+                if version is not None:
+                    versions.append(version)
+                versions.sort(key=lambda version: version.number)
+                self._versions[key] = versions
+
+    def poll(self, base_path: str):
+        """
+        Check a base path for new versions without listing the version directories
+        unless it changed, the files of its latest version are always scanned again
+        """
+        key = os.path.normpath(base_path)
+        with self._lock:
+            listing = self._listings.get(key)
+            versions = self._versions.get(key, [])
+        if listing is None or listing != self._get_listing(key):
+            return self.scan(key)
+        if len(versions) > 0:
+            self.update(key, [str(versions[-1].path)])
+
+    def get_versions(self, base_path: str) -> list:
+        key = os.path.normpath(base_path)
+        if key not in self._versions:
+            self.scan(key)
+        with self._lock:
+            return list(self._versions[key])
+
+    def get_model(self, base_path: str, number: int = None) -> Artifact:
+        """
+        Get the model file of the latest version, or of the given one, if there is
+        exactly one .bin or .ftz file in it
+        """
+        versions = self.get_versions(base_path)
+        if number is not None:
+            versions = [version for version in versions if version.number == number]
+        if len(versions) == 0:
+            return None
+        version = versions[-1]
+        models = [name for name in version.files if name.endswith(MODEL_SUFFIXES)]
+        if len(models) != 1:
+            return None
+        return Artifact(version.path / models[0], *version.files[models[0]])
+
+    @staticmethod
+    def _get_listing(key: str):
+        try:
+            return os.path.realpath(key), os.stat(key).st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def _list_versions(key: str) -> list:
+        try:
+            with os.scandir(key) as entries:
+                return [
+                    entry.name
+                    for entry in entries
+                    if entry.name.isdigit() and entry.is_dir()
+                ]
+        except OSError:
+            return []
+
+    @staticmethod
+    def _scan_version(key: str, name: str) -> Version:
+        path = Path(key) / name
+        files = {}
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return None
+        return Version(int(name), path, files)
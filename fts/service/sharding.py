@@ -0,0 +1,113 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+import multiprocessing
+import os
+from threading import Lock, Thread
+
+from fts.utils.logger import get_logger
+
+logger = get_logger()
+
+# fastText models of the serving process, inherited by the processes forked from it
+_forked_models = {}
+
+
+def _predict_shard(model_name: str, version: int, sentences: list, k, threshold):
+    return _forked_models[(model_name, version)].predict(
+        sentences, k=k, threshold=threshold
+    )
+
+
+class ShardPool(object):
+    """
+    Splits batches larger than the shard size into at most max_shards shards,
+    predicted in parallel by a pool of processes and joined in the original order.
+    fastText holds the GIL while predicting, so threads would not use more cores.
+    The processes are forked from the serving process once the models are loaded,
+    sharing their memory pages. They are forked again on the first large batch
+    after a model is loaded, as they only have the models served when forked
+    """
+
+    def __init__(self, get_models, processes: int, shard_size: int, max_shards: int):
+        self._get_models = get_models
+        self._processes = processes
+        self._shard_size = shard_size
+        self._max_shards = max_shards
+        self._context = multiprocessing.get_context("fork")
+        self._lock = Lock()
+        self._pool = None
+        self._pid = None
+        self._versions = frozenset()
+
+    def predict(self, model_name: str, version: int, sentences: list, k, threshold):
+        """
+        Predict the shards of a large batch in the pool. Returns the labels and
+        scores of the sentences, or None if the batch is not sharded
+        """
+        shards = self._split(sentences)
+        if len(shards) < 2:
+            return None
+
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._fork()
+            if (model_name, version) not in self._versions:
+                return None
+            results = [
+                self._pool.apply_async(
+                    _predict_shard, (model_name, version, shard, k, threshold)
+                )
+                for shard in shards
+            ]
+
+        labels, scores = [], []
+        for result in results:
+            shard_labels, shard_scores = result.get()
+            labels.extend(shard_labels)
+            scores.extend(shard_scores)
+        return labels, scores
+
+    def invalidate(self):
+        """
+        Fork the pool again on the next large batch, once a model is loaded or
+        evicted. The previous processes exit after predicting their shards
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None and self._pid == os.getpid():
+            pool.close()
+            Thread(target=pool.join, daemon=True).start()
+
+    def _split(self, sentences: list) -> list:
+        if len(sentences) <= self._shard_size:
+            return [sentences]
+        count = min(math.ceil(len(sentences) / self._shard_size), self._max_shards)
+        size = math.ceil(len(sentences) / count)
+        return [sentences[i : i + size] for i in range(0, len(sentences), size)]
+
+    def _fork(self):
+        """
+        Fork the processes with the models served now. Called with the lock held
+        """
+        global _forked_models
+        _forked_models = self._get_models()
+        self._versions = frozenset(_forked_models)
+        self._pool = self._context.Pool(self._processes)
+        self._pid = os.getpid()
+        logger.info(
+            f"Forked {self._processes} processes to predict the shards of "
+            f"{len(self._versions)} model versions"
+        )
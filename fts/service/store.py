@@ -0,0 +1,136 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import shutil
+import tempfile
+from contextlib import contextmanager
+from hashlib import blake2b
+from pathlib import Path
+
+import numpy as np
+
+
+def _hash(word: str) -> int:
+    return int.from_bytes(blake2b(word.encode(), digest_size=8).digest(), "little")
+
+
+@contextmanager
+def save_directory(path: Path):
+    """
+    Yield a temporary directory of this process to write the files of a directory
+    saved next to a model, renamed to the given path once they are written. So a
+    partial directory is never loaded, and one another process saved meanwhile is
+    kept
+    """
+    tmp_path = Path(
+        tempfile.mkdtemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    )
+    try:
+        yield tmp_path
+        try:
+            tmp_path.rename(path)
+        except OSError:
+            if not path.is_dir():
+                raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+class EmbeddingStore(object):
+    """
+    Vocabulary and word vectors of a model saved as memory-mapped files, so every
+    process serving the model shares the same page cache pages:
+      - matrix.npy: the vector of each word, one row per word
+      - words.bin and offsets.npy: the UTF-8 words and where each one starts
+      - hashes.npy and hash_rows.npy: the sorted hashes of the words and their
+        rows, to look up words with a binary search
+    """
+
+    FILES = ("matrix", "offsets", "hashes", "hash_rows")
+
+    def __init__(self, matrix, words, offsets, hashes, hash_rows):
+        self.matrix = matrix
+        self._words = words
+        self._offsets = offsets
+        self._hashes = hashes
+        self._hash_rows = hash_rows
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def __getitem__(self, row: int) -> str:
+        return bytes(self._words[self._offsets[row] : self._offsets[row + 1]]).decode()
+
+    def get(self, word: str, default=None):
+        row = self.lookup([word])[0]
+        return default if row < 0 else row
+
+    def lookup(self, words: list) -> np.ndarray:
+        """
+        Get the row of every word, or -1 if it is not in the vocabulary
+        """
+        hashes = np.fromiter((_hash(word) for word in words), np.uint64, len(words))
+        positions = np.searchsorted(self._hashes, hashes)
+        rows = np.full(len(words), -1, dtype=np.int64)
+        for index in np.flatnonzero(positions < len(self._hashes)):
+            # Words with the same hash are next to each other
+            position = positions[index]
+            while (
+                position < len(self._hashes) and self._hashes[position] == hashes[index]
+            ):
+                row = self._hash_rows[position]
+                if self[row] == words[index]:
+                    rows[index] = row
+                    break
+                position += 1
+        return rows
+
+    @staticmethod
+    def export(path: Path, words: list, matrix: np.ndarray):
+        """
+        Write the vocabulary and vectors of a model
+        """
+        encoded = [word.encode() for word in words]
+        offsets = np.zeros(len(words) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(word) for word in encoded])
+        hashes = np.fromiter((_hash(word) for word in words), np.uint64, len(words))
+        hash_rows = np.argsort(hashes, kind="stable").astype(np.int64)
+
+        with save_directory(path) as tmp_path:
+            np.save(tmp_path / "matrix.npy", matrix.astype(np.float32, copy=False))
+            np.save(tmp_path / "offsets.npy", offsets)
+            np.save(tmp_path / "hashes.npy", hashes[hash_rows])
+            np.save(tmp_path / "hash_rows.npy", hash_rows)
+            with open(tmp_path / "words.bin", "wb") as words_file:
+                words_file.write(b"".join(encoded))
+
+    @classmethod
+    def load(cls, path: Path, rows: int, columns: int):
+        """
+        Memory-map an exported store, or return None if it does not exist or does
+        not match the shape of the vocabulary
+        """
+        files = [path / f"{name}.npy" for name in cls.FILES] + [path / "words.bin"]
+        if not all(file.is_file() for file in files):
+            return None
+        matrix, offsets, hashes, hash_rows = (
+            np.load(file, mmap_mode="r") for file in files[:-1]
+        )
+        if matrix.shape != (rows, columns) or len(offsets) != rows + 1:
+            return None
+        if files[-1].stat().st_size == 0:
+            words = np.zeros(0, dtype=np.uint8)
+        else:
+            words = np.memmap(files[-1], dtype=np.uint8, mode="r")
+        return cls(matrix, words, offsets, hashes, hash_rows)
@@ -0,0 +1,215 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+from threading import Condition, Thread
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from fts.utils.logger import get_logger
+
+logger = get_logger()
+
+
+class ModelUpdateHandler(FileSystemEventHandler):
+    """
+    Pushes the paths of the filesystem events to the watcher. Runs on the observer
+    thread, so it never waits for the models to be written
+    """
+
+    def __init__(self, watcher):
+        self._watcher = watcher
+
+    def on_created(self, event):
+        self._watcher.notify(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._watcher.notify(event.src_path)
+
+    def on_moved(self, event):
+        # Atomic renames and symlink swaps publish the destination path
+        self._watcher.notify(event.dest_path)
+
+
+class ModelWatcher(object):
+    """
+    Reloads the models whose latest version changes. Changes are found from
+    filesystem events, or by polling the latest version of every base path, and
+    coalesced in a queue until the base path has not changed for a debounce time.
+    The model repository index is updated with the changed paths when they are
+    checked, out of the observer thread.
+    A version is reloaded once it is complete: its marker file exists if there is
+    one, otherwise the size and modification time of its model file are the same
+    in two checks a debounce time apart
+    """
+
+    def __init__(
+        self,
+        models_path: str,
+        get_base_paths,
+        repository,
+        reload_fn,
+        debounce: float = 1.0,
+        marker: str = "",
+        polling: bool = False,
+        poll_interval: float = 10.0,
+    ):
+        self._models_path = models_path
+        self._get_base_paths = get_base_paths
+        self._repository = repository
+        self._reload_fn = reload_fn
+        self._debounce = debounce
+        self._marker = marker
+        self._polling = polling
+        self._poll_interval = poll_interval
+        self._condition = Condition()
+        self._pending = {}  # base path: time of its next check
+        self._changes = {}  # base path: paths changed since its last check
+        self._checked = {}  # base path: signature found in its previous check
+        self._loaded = {}  # base path: signature of its last reloaded version
+
+    def start(self):
+        """
+        Start watching from the versions found now. Threads do not survive a fork,
+        so it runs in the process that loads the models
+        """
+        for base_path in self._get_base_paths():
+            self._loaded[base_path] = self._get_signature(base_path)
+        if not self._polling:
+            self._observer = Observer()
+            self._observer.schedule(
+                ModelUpdateHandler(self), path=self._models_path, recursive=True
+            )
+            self._observer.start()
+        Thread(target=self._run, daemon=True).start()
+
+    def notify(self, path: str):
+        """
+        Queue the base paths affected by a changed path, postponing their check
+        """
+        path = os.path.normpath(path)
+        base_paths = [
+            base_path
+            for base_path in self._get_base_paths()
+            if path == os.path.normpath(base_path)
+            or path.startswith(os.path.normpath(base_path) + os.sep)
+        ]
+        if len(base_paths) == 0:
+            # A swapped directory or symlink holding the base paths, like the
+            # ..data symlink of Kubernetes volumes
+            parent = os.path.dirname(path) + os.sep
+            base_paths = [
+                base_path
+                for base_path in self._get_base_paths()
+                if os.path.normpath(base_path).startswith(parent)
+            ]
+
+        with self._condition:
+            for base_path in base_paths:
+                self._pending[base_path] = time.monotonic() + self._debounce
+                self._changes.setdefault(base_path, set()).add(path)
+                self._checked.pop(base_path, None)
+            self._condition.notify()
+
+    def _run(self):
+        next_poll = time.monotonic() + self._poll_interval
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                deadlines = list(self._pending.values())
+                if self._polling:
+                    deadlines.append(next_poll)
+                if len(deadlines) == 0:
+                    self._condition.wait()
+                    continue
+                if min(deadlines) > now:
+                    self._condition.wait(min(deadlines) - now)
+                    continue
+                # Base paths checked again have no changes, their latest version
+                # is scanned again
+                due = {
+                    base_path: self._changes.pop(base_path, None)
+                    for base_path, at in self._pending.items()
+                    if at <= now
+                }
+                for base_path in due:
+                    del self._pending[base_path]
+
+            if self._polling and now >= next_poll:
+                next_poll = now + self._poll_interval
+                for base_path in self._poll():
+                    due.setdefault(base_path, [])
+            for base_path, paths in due.items():
+                try:
+                    self._check(base_path, paths)
+                except Exception as ex:
+                    logger.warning(f"Error checking the models of {base_path}: {ex}")
+
+    def _poll(self) -> list:
+        """
+        Poll the base paths without a pending check, and get the ones whose latest
+        version changed since it was reloaded
+        """
+        with self._condition:
+            pending = set(self._pending)
+        changed = []
+        for base_path in self._get_base_paths():
+            if base_path not in pending:
+                self._repository.poll(base_path)
+                if self._get_signature(base_path) != self._loaded.get(base_path):
+                    changed.append(base_path)
+        return changed
+
+    def _check(self, base_path: str, paths):
+        if paths is None:
+            self._repository.poll(base_path)
+        else:
+            self._repository.update(base_path, paths)
+        signature = self._get_signature(base_path)
+        if signature is None or signature == self._loaded.get(base_path):
+            return
+
+        # Wait for the version to be complete, checking it again later
+        if self._marker != "":
+            complete = signature[-1]
+        else:
+            complete = signature == self._checked.get(base_path)
+        if not complete:
+            with self._condition:
+                self._checked[base_path] = signature
+                if self._marker == "":
+                    self._pending.setdefault(
+                        base_path, time.monotonic() + self._debounce
+                    )
+                    self._condition.notify()
+            return
+
+        self._loaded[base_path] = signature
+        self._reload_fn(base_path)
+
+    def _get_signature(self, base_path: str):
+        """
+        Identify the latest version of a base path by the resolved path, size and
+        modification time of its model file, and whether its marker file exists
+        """
+        model = self._repository.get_model(base_path)
+        if model is None:
+            return None
+        marked = self._marker != "" and (
+            self._marker in self._repository.get_versions(base_path)[-1].files
+        )
+        return os.path.realpath(model.path), model.size, model.mtime, marked
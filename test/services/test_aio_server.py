@@ -0,0 +1,76 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import unittest
+from threading import Thread
+
+import grpc
+from fts.protos import service_pb2, service_pb2_grpc
+from fts.server import AsyncFastTextServicer
+
+
+class TestAsyncServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._loop = asyncio.new_event_loop()
+        cls._server = cls._loop.run_until_complete(cls._create_server())
+        cls._server_thread = Thread(target=cls._loop.run_forever)
+        cls._server_thread.start()
+        cls._channel = grpc.insecure_channel("localhost:50052")
+        cls.stub = service_pb2_grpc.FastTextStub(cls._channel)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._channel.close()
+        asyncio.run_coroutine_threadsafe(cls._server.stop(0), cls._loop).result()
+        cls._loop.call_soon_threadsafe(cls._loop.stop)
+        cls._server_thread.join()
+
+    @staticmethod
+    async def _create_server():
+        server = grpc.aio.server()
+        service_pb2_grpc.add_FastTextServicer_to_server(
+            AsyncFastTextServicer(max_workers=4), server
+        )
+        server.add_insecure_port("[::]:50052")
+        await server.start()
+        return server
+
+    def test_predict(self):
+        request = service_pb2.PredictRequest(
+            model_name="correct", batch=["total price", "quantity"], k=2
+        )
+        response = self.stub.Predict(request, None)
+        self.assertTrue(len(response.predictions) == 2)
+        self.assertTrue(len(response.predictions[0].labels) == 2)
+        self.assertTrue(response.model.name == request.model_name)
+
+    def test_predict_stream(self):
+        requests = [
+            service_pb2.PredictRequest(model_name="correct", batch=["price"], k=1)
+            for i in range(10)
+        ]
+        responses = list(self.stub.PredictStream(iter(requests)))
+        self.assertTrue(len(responses) == 10)
+
+    def test_not_loaded_model(self):
+        request = service_pb2.PredictRequest(model_name="folder", batch=["price"])
+        with self.assertRaises(grpc.RpcError) as error:
+            self.stub.Predict(request, None)
+        self.assertTrue(error.exception.code() == grpc.StatusCode.FAILED_PRECONDITION)
+
+
+if __name__ == "__main__":
+    unittest.main()
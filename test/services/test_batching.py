@@ -0,0 +1,99 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from multiprocessing.pool import ThreadPool
+
+from fts.service.batching import PredictBatcher
+from fts.service.exceptions import FastTextException
+
+
+class TestBatching(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def predict(self, model_name, sentences, k, threshold):
+        self.calls.append(len(sentences))
+        if "fail" in sentences:
+            raise ValueError("fail")
+        labels = [[sentence] * k for sentence in sentences]
+        scores = [[float(len(sentence))] * k for sentence in sentences]
+        return model_name, labels, scores
+
+    def test_results_split_back(self):
+        batcher = PredictBatcher(self.predict, max_batch_size=64, max_wait_ms=50)
+        with ThreadPool(processes=8) as pool:
+            results = [
+                pool.apply_async(
+                    batcher.predict, ("model", [str(i), str(i) * 2], 2, 0.0)
+                )
+                for i in range(32)
+            ]
+            for i, result in enumerate(results):
+                model, labels, scores = result.get()
+                self.assertEqual(model, "model")
+                self.assertEqual(labels, [[str(i)] * 2, [str(i) * 2] * 2])
+        self.assertLess(len(self.calls), 32)
+        self.assertTrue(all(size <= 64 for size in self.calls))
+
+    def test_stats(self):
+        batcher = PredictBatcher(self.predict, max_batch_size=4, max_wait_ms=1)
+        batcher.predict("model", ["a", "b"], 1, 0.0)
+        stats = batcher.get_stats("model")
+        self.assertEqual(stats.batches, 1)
+        self.assertEqual(stats.requests, 1)
+        self.assertEqual(stats.sentences, 2)
+        self.assertAlmostEqual(stats.mean_fill_ratio, 0.5)
+        self.assertEqual(batcher.get_stats("other").batches, 0)
+
+    def test_idle_workers_exit(self):
+        batcher = PredictBatcher(self.predict, max_batch_size=4, max_wait_ms=1)
+        workers = []
+        for threshold in range(20):
+            batcher.predict("model", ["a"], 1, float(threshold))
+            workers.append(batcher._workers.get(("model", 1, float(threshold))))
+        for worker in workers:
+            if worker is not None:
+                worker.join(1)
+        self.assertFalse(any(worker.is_alive() for worker in workers if worker))
+        self.assertEqual(len(batcher._queues), 0)
+        self.assertEqual(batcher.get_stats("model").requests, 20)
+
+    def test_exception_propagated(self):
+        batcher = PredictBatcher(self.predict, max_batch_size=4, max_wait_ms=1)
+        with self.assertRaises(ValueError):
+            batcher.predict("model", ["fail"], 1, 0.0)
+        self.assertEqual(batcher.predict("model", ["ok"], 1, 0.0)[1], [["ok"]])
+
+    def test_failing_request_alone(self):
+        batcher = PredictBatcher(self.predict, max_batch_size=64, max_wait_ms=50)
+        with ThreadPool(processes=3) as pool:
+            results = [
+                pool.apply_async(batcher.predict, ("model", batch, 1, 0.0))
+                for batch in [["ok"], ["fail"], ["fine"]]
+            ]
+            self.assertEqual(results[0].get()[1], [["ok"]])
+            with self.assertRaises(ValueError):
+                results[1].get()
+            self.assertEqual(results[2].get()[1], [["fine"]])
+
+    def test_newlines(self):
+        batcher = PredictBatcher(self.predict, max_batch_size=4, max_wait_ms=1)
+        with self.assertRaises(FastTextException):
+            batcher.predict("model", ["bad\ntext"], 1, 0.0)
+        self.assertEqual(self.calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
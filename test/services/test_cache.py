@@ -0,0 +1,98 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from multiprocessing.pool import ThreadPool
+from threading import Event
+
+from fts.protos import model_pb2
+from fts.service.cache import PredictionCache
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.computed = []
+
+    def compute(self, texts):
+        self.computed += texts
+        return [model_pb2.Prediction(labels=[text]) for text in texts]
+
+    def test_hits_and_misses(self):
+        cache = PredictionCache(max_memory=100000)
+        first = cache.get_or_compute("model", 1, 1, ["a", "b"], self.compute)
+        second = cache.get_or_compute("model", 1, 1, ["b", "c"], self.compute)
+        self.assertEqual([p.labels[0] for p in first + second], ["a", "b", "b", "c"])
+        self.assertEqual(self.computed, ["a", "b", "c"])
+        stats = cache.get_stats("model")
+        self.assertEqual((stats.hits, stats.misses, stats.entries), (1, 3, 3))
+
+    def test_version_and_k_in_key(self):
+        cache = PredictionCache(max_memory=100000)
+        cache.get_or_compute("model", 1, 1, ["a"], self.compute)
+        cache.get_or_compute("model", 2, 1, ["a"], self.compute)
+        cache.get_or_compute("model", 2, 2, ["a"], self.compute)
+        self.assertEqual(self.computed, ["a", "a", "a"])
+
+    def test_lru_eviction(self):
+        cache = PredictionCache(max_memory=1000)
+        for i in range(100):
+            cache.get_or_compute("model", 1, 1, [str(i)], self.compute)
+        stats = cache.get_stats("model")
+        self.assertLess(stats.entries, 100)
+        self.assertLessEqual(stats.memory, 1000)
+        cache.get_or_compute("model", 1, 1, ["99"], self.compute)
+        self.assertEqual(len(self.computed), 100)
+
+    def test_invalidate(self):
+        cache = PredictionCache(max_memory=100000)
+        cache.get_or_compute("model", 1, 1, ["a"], self.compute)
+        cache.get_or_compute("other", 1, 1, ["a"], self.compute)
+        cache.invalidate("model")
+        self.assertEqual(cache.get_stats("model").entries, 0)
+        self.assertEqual(cache.get_stats("other").entries, 1)
+
+    def test_invalidate_kept_versions(self):
+        cache = PredictionCache(max_memory=100000)
+        for version in [1, 2, 3]:
+            cache.get_or_compute("model", version, 1, ["a"], self.compute)
+        cache.invalidate("model", {2, 3})
+        self.assertEqual(cache.get_stats("model").entries, 2)
+        cache.get_or_compute("model", 2, 1, ["a"], self.compute)
+        cache.get_or_compute("model", 1, 1, ["a"], self.compute)
+        self.assertEqual(len(self.computed), 4)
+
+    def test_in_flight_shared(self):
+        cache = PredictionCache(max_memory=100000)
+        started, release = Event(), Event()
+
+        def slow_compute(texts):
+            started.set()
+            release.wait()
+            return self.compute(texts)
+
+        with ThreadPool(processes=2) as pool:
+            first = pool.apply_async(
+                cache.get_or_compute, ("model", 1, 1, ["a"], slow_compute)
+            )
+            started.wait()
+            second = pool.apply_async(
+                cache.get_or_compute, ("model", 1, 1, ["a"], slow_compute)
+            )
+            release.set()
+            self.assertEqual(first.get(), second.get())
+        self.assertEqual(self.computed, ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
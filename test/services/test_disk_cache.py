@@ -0,0 +1,144 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import grpc
+import sqlite3
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from fts.protos import model_pb2, service_pb2
+from fts.service.disk_cache import DiskCache
+from fts.service.exceptions import _set_grpc_error
+from test.test_utils import TemporaryModelsTest
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = str(Path(self.directory.name) / "cache.sqlite")
+        self.computed = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def compute(self, texts):
+        self.computed += texts
+        return [model_pb2.Prediction(labels=[text]) for text in texts]
+
+    def get(self, cache, version, texts, operation="predict"):
+        return cache.get_or_compute(
+            "model",
+            version,
+            operation,
+            (1, 0.0),
+            texts,
+            self.compute,
+            encode=model_pb2.Prediction.SerializeToString,
+            decode=model_pb2.Prediction.FromString,
+        )
+
+    def test_hits_across_restarts(self):
+        self.get(DiskCache(self.path, 100000), 1, ["a", "b"])
+        cache = DiskCache(self.path, 100000)
+        predictions = self.get(cache, 1, ["b", "c", "a"])
+        self.assertEqual([p.labels[0] for p in predictions], ["b", "c", "a"])
+        self.assertEqual(self.computed, ["a", "b", "c"])
+        stats = cache.get_stats("model")
+        self.assertEqual((stats.hits, stats.misses, stats.entries), (2, 1, 3))
+
+    def test_key(self):
+        cache = DiskCache(self.path, 100000)
+        self.get(cache, 1, ["a"])
+        self.get(cache, 2, ["a"])
+        self.get(cache, 1, ["a"], operation="other")
+        self.assertEqual(self.computed, ["a", "a", "a"])
+
+    def test_hits_do_not_write(self):
+        cache = DiskCache(self.path, 100000)
+        self.get(cache, 1, ["a", "b"])
+        changes = cache._connection.total_changes
+        self.get(cache, 1, ["a"])
+        self.assertEqual(cache._connection.total_changes, changes)
+
+        # The access times are written when compacting
+        cache._compact()
+        accessed = dict(
+            cache._connection.execute("SELECT value, accessed FROM entries")
+        )
+        first, second = [
+            accessed[model_pb2.Prediction(labels=[text]).SerializeToString()]
+            for text in ["a", "b"]
+        ]
+        self.assertGreater(first, second)
+
+    def test_drop_old_versions(self):
+        cache = DiskCache(self.path, 100000)
+        self.get(cache, 1, ["a", "b"])
+        self.get(cache, 2, ["a"])
+        self.get(cache, 3, ["a"])
+        cache.drop_old_versions("model", [2, 3])
+        cache._compact()
+        self.assertEqual(cache.get_stats("model").entries, 2)
+        self.get(cache, 2, ["a"])
+        self.get(cache, 3, ["a"])
+        self.assertEqual(self.computed, ["a", "b", "a", "a"])
+
+    def test_size_limit(self):
+        cache = DiskCache(self.path, 200000)
+        self.get(cache, 1, [str(i) * 100 for i in range(5000)])
+        self.assertTrue(cache.get_stats("model").memory > 200000)
+        cache._compact()
+        stats = cache.get_stats("model")
+        self.assertTrue(stats.memory <= 200000)
+        self.assertTrue(0 < stats.entries < 5000)
+
+    def test_create_directory(self):
+        path = Path(self.directory.name) / "cache" / "cache.sqlite"
+        DiskCache(str(path), 100000)
+        self.assertTrue(path.is_file())
+
+    def test_bad_path(self):
+        # Fails at startup instead of in every request
+        with self.assertRaises(sqlite3.Error) as error:
+            DiskCache(self.directory.name, 100000)
+        context = mock.Mock()
+        _set_grpc_error(context, error.exception)
+        context.set_code.assert_called_once_with(grpc.StatusCode.INTERNAL)
+
+
+class TestServiceDiskCache(TemporaryModelsTest):
+    def configure(self, config):
+        config["disk_cache"] = {
+            "enabled": True,
+            "path": str(self.models_path / "cache.sqlite"),
+        }
+
+    def test_predict(self):
+        request = service_pb2.PredictRequest(
+            model_name="model", batch=["disk cache test"], k=1
+        )
+        first = self.service.predict(request)
+        second = self.service.predict(request)
+        self.assertEqual(first.predictions, second.predictions)
+        status = self.service.get_model_status(
+            service_pb2.ModelStatusRequest(model=model_pb2.ModelSpec(name="model"))
+        ).status
+        self.assertEqual(status.disk_cache.hits, 1)
+        self.assertEqual(status.disk_cache.entries, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
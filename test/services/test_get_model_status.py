@@ -13,8 +13,11 @@
 # limitations under the License.
 
 import grpc
-from test.test_utils import FastTextServingTest
+from pathlib import Path
+from unittest import mock
+from test.test_utils import FastTextServingTest, TemporaryModelsTest
 from fts.protos import model_pb2, service_pb2
+from fts.service import fasttext_service
 
 
 class TestModelStatus(FastTextServingTest):
@@ -41,6 +44,30 @@ class TestModelStatus(FastTextServingTest):
             model_pb2.ModelStatus.ModelState.Name(response.status.state) == "LOADED"
         )
 
+    def test_vocabulary(self):
+        request = service_pb2.ModelStatusRequest(
+            model=model_pb2.ModelSpec(name="vectors")
+        )
+        response = self.stub.GetModelStatus(request)
+        self.assertTrue(response.status.vocabulary.words > 0)
+        self.assertTrue(response.status.vocabulary.memory > 0)
+
+    def test_memory(self):
+        request = service_pb2.ModelStatusRequest(
+            model=model_pb2.ModelSpec(name="vectors")
+        )
+        response = self.stub.GetModelStatus(request)
+        size = Path("test/resources/models/vectors/1/vectors.bin").stat().st_size
+        self.assertEqual(response.status.memory.estimated, size)
+        self.assertEqual(response.status.memory.measured, size)
+
+    def test_versions(self):
+        request = service_pb2.ModelStatusRequest(
+            model=model_pb2.ModelSpec(name="corrupt")
+        )
+        response = self.stub.GetModelStatus(request)
+        self.assertEqual(list(response.status.versions), [1])
+
     def test_unknown(self):
         request = service_pb2.ModelStatusRequest(model=model_pb2.ModelSpec(name="foo"))
         response = self.stub.GetModelStatus(request)
@@ -67,5 +94,34 @@ class TestModelStatus(FastTextServingTest):
         )
 
 
+class TestMeasuredMemory(TemporaryModelsTest):
+    def configure(self, config):
+        config["memory"]["measure"] = True
+
+    def load(self):
+        self.service._load_model("model", self.models_path / "model")
+        request = service_pb2.ModelStatusRequest(
+            model=model_pb2.ModelSpec(name="model")
+        )
+        return self.service.get_model_status(request).status.memory
+
+    def test_measured(self):
+        with mock.patch.object(
+            fasttext_service, "get_rss", side_effect=[1000, 1000 + self.size * 3]
+        ):
+            memory = self.load()
+        self.assertEqual(memory.measured, self.size * 3)
+        self.assertEqual(memory.estimated, self.size)
+        self.assertEqual(self.service._available_memory, self.size * 7)
+
+    def test_concurrent_load(self):
+        # Another load would be part of the measured growth
+        with self.service._measure_lock, mock.patch.object(
+            fasttext_service, "get_rss", side_effect=[1000, 1000 + self.size * 3]
+        ):
+            memory = self.load()
+        self.assertEqual(memory.measured, self.size)
+
+
 if __name__ == "__main__":
     unittest.main()
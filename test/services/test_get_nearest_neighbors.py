@@ -0,0 +1,202 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import grpc
+import numpy as np
+from pathlib import Path
+from unittest import mock
+from test.test_utils import FastTextServingTest, TemporaryModelsTest
+from fts.protos import model_pb2, service_pb2
+from fts.service.fasttext_service import FastTextService
+from fts.service.neighbors import IVFIndex
+from fts.service.store import EmbeddingStore
+
+
+class TestNearestNeighbors(FastTextServingTest):
+    def test_words(self):
+        request = service_pb2.NearestNeighborsRequest(
+            model_name="vectors", batch=["good", "bad"], k=3
+        )
+        response = self.stub.GetNearestNeighbors(request, None)
+        self.assertTrue(len(response.neighbors) == 2)
+        self.assertTrue(response.model.name == request.model_name)
+        for word, neighbors in zip(request.batch, response.neighbors):
+            self.assertTrue(len(neighbors.words) == 3)
+            self.assertFalse(word in neighbors.words)
+            self.assertEqual(list(neighbors.scores), sorted(neighbors.scores)[::-1])
+
+    def test_vectors(self):
+        words = service_pb2.VectorsRequest(model_name="vectors", batch=["good"])
+        vector = self.stub.GetWordsVectors(words, None).vectors[0].element
+        request = service_pb2.NearestNeighborsRequest(
+            model_name="vectors",
+            vectors=model_pb2.Matrix(
+                rows=1,
+                columns=len(vector),
+                data=np.asarray(vector, dtype="<f4").tobytes(),
+            ),
+            k=1,
+        )
+        response = self.stub.GetNearestNeighbors(request, None)
+        self.assertEqual(list(response.neighbors[0].words), ["good"])
+        self.assertAlmostEqual(response.neighbors[0].scores[0], 1.0, places=5)
+
+    def test_approximate_not_enabled(self):
+        request = service_pb2.NearestNeighborsRequest(
+            model_name="vectors", batch=["good"], approximate=True
+        )
+        with self.assertRaises(grpc.RpcError) as error:
+            self.stub.GetNearestNeighbors(request, None)
+        self.assertEqual(error.exception.code(), grpc.StatusCode.FAILED_PRECONDITION)
+
+    def test_float16_vectors(self):
+        words = service_pb2.VectorsRequest(
+            model_name="vectors", batch=["good"], encoding=model_pb2.Matrix.FLOAT16
+        )
+        request = service_pb2.NearestNeighborsRequest(
+            model_name="vectors",
+            vectors=self.stub.GetWordsVectors(words, None).matrix,
+            k=1,
+        )
+        response = self.stub.GetNearestNeighbors(request, None)
+        self.assertEqual(list(response.neighbors[0].words), ["good"])
+
+    def test_wrong_dimension(self):
+        request = service_pb2.NearestNeighborsRequest(
+            model_name="vectors",
+            vectors=model_pb2.Matrix(rows=1, columns=2, data=bytes(8)),
+        )
+        try:
+            self.stub.GetNearestNeighbors(request, None)
+            self.fail()
+        except grpc.RpcError as error:
+            self.assertTrue(error._state.code == grpc.StatusCode.INVALID_ARGUMENT)
+
+    def test_unknown_encoding(self):
+        words = service_pb2.VectorsRequest(model_name="vectors", batch=["good"])
+        columns = len(self.stub.GetWordsVectors(words, None).vectors[0].element)
+        request = service_pb2.NearestNeighborsRequest(
+            model_name="vectors",
+            vectors=model_pb2.Matrix(
+                rows=1, columns=columns, encoding=7, data=bytes(4 * columns)
+            ),
+        )
+        with self.assertRaises(grpc.RpcError) as error:
+            self.stub.GetNearestNeighbors(request, None)
+        self.assertEqual(error.exception.code(), grpc.StatusCode.INVALID_ARGUMENT)
+
+    def test_model_not_loaded(self):
+        request = service_pb2.NearestNeighborsRequest(
+            model_name="fghfdhg", batch=["price"]
+        )
+        try:
+            self.stub.GetNearestNeighbors(request, None)
+            self.fail()
+        except grpc.RpcError as error:
+            self.assertTrue(error._state.code == grpc.StatusCode.FAILED_PRECONDITION)
+
+
+class TestSavedVectors(TemporaryModelsTest):
+    """
+    A copy of the vectors model, with its store and index saved next to it
+    """
+
+    MODEL_PATH = Path("test/resources/models/vectors")
+
+    def setUp(self):
+        super().setUp()
+        self.model_path = next((self.models_path / "model" / "1").glob("*.bin"))
+
+    def configure(self, config):
+        config["vectors"] = {
+            "nearest_neighbors": True,
+            "embedding_store": True,
+            "ann_index": {"enabled": True, "lists": 4},
+        }
+
+    def get_neighbors(self, approximate):
+        request = service_pb2.NearestNeighborsRequest(
+            model_name="model",
+            batch=["good", "bad"],
+            k=3,
+            approximate=approximate,
+            probes=4,
+        )
+        return self.service.get_nearest_neighbors(request)
+
+    def test_approximate(self):
+        exact = self.get_neighbors(approximate=False)
+        approximate = self.get_neighbors(approximate=True)
+        for exact_neighbors, neighbors in zip(exact.neighbors, approximate.neighbors):
+            self.assertEqual(exact_neighbors.words, neighbors.words)
+            self.assertTrue(np.allclose(exact_neighbors.scores, neighbors.scores))
+
+    def test_whole_vocabulary(self):
+        size = len(self.service._models["model"].vocabulary.words)
+        responses = [
+            self.service.get_nearest_neighbors(
+                service_pb2.NearestNeighborsRequest(
+                    model_name="model",
+                    batch=["good", "unknownword"],
+                    k=100000,
+                    approximate=approximate,
+                    probes=4,
+                )
+            )
+            for approximate in (False, True)
+        ]
+        for response in responses:
+            # Out of vocabulary words have no row to exclude
+            self.assertEqual(
+                [len(neighbors.words) for neighbors in response.neighbors],
+                [size - 1, size],
+            )
+
+    def test_saved(self):
+        model = self.service._models["model"]
+        self.assertTrue(self.model_path.with_suffix(".vectors").is_dir())
+        self.assertTrue(self.model_path.with_suffix(".ivf").is_dir())
+        self.assertTrue(isinstance(model.vocabulary.rows, EmbeddingStore))
+        self.assertTrue(isinstance(model.index.vectors, np.memmap))
+
+    def test_not_saved(self):
+        # A read-only models volume
+        with mock.patch.object(
+            EmbeddingStore, "export", side_effect=PermissionError("read-only")
+        ), mock.patch.object(
+            IVFIndex, "save", side_effect=PermissionError("read-only")
+        ), mock.patch.object(
+            FastTextService, "_is_up_to_date", return_value=False
+        ):
+            self.assertTrue(
+                self.service._load_model("model", self.model_path.parents[1])
+            )
+        model = self.service._models["model"]
+        self.assertFalse(isinstance(model.vocabulary.rows, EmbeddingStore))
+        self.assertFalse(isinstance(model.index.vectors, np.memmap))
+        self.assertEqual(len(self.get_neighbors(approximate=True).neighbors), 2)
+
+    def test_store_not_loaded(self):
+        # The store of another process removed after it was exported
+        with mock.patch.object(EmbeddingStore, "load", return_value=None):
+            self.assertTrue(
+                self.service._load_model("model", self.model_path.parents[1])
+            )
+        model = self.service._models["model"]
+        self.assertFalse(isinstance(model.vocabulary.rows, EmbeddingStore))
+        self.assertEqual(len(self.get_neighbors(approximate=False).neighbors), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import grpc
+import numpy as np
+from test.test_utils import FastTextServingTest
+from fts.protos import model_pb2, service_pb2
+from fts.service.matrix import unpack_matrix
+
+
+class TestSentenceVectors(FastTextServingTest):
+    def test_various_sentences(self):
+        request = service_pb2.SentenceVectorsRequest(
+            model_name="correct", batch=["total price", "quantity", "total price"]
+        )
+        response = self.stub.GetSentenceVectors(request, None)
+        self.assertTrue(response.matrix.rows == 3)
+        self.assertTrue(response.model.name == request.model_name)
+        vectors = np.frombuffer(response.matrix.data, dtype="<f4").reshape(3, -1)
+        self.assertTrue(np.array_equal(vectors[0], vectors[2]))
+        self.assertTrue(len(response.invalid) == 0)
+
+    def test_int8_encoding(self):
+        request = service_pb2.SentenceVectorsRequest(
+            model_name="correct", batch=["total price", "quantity"]
+        )
+        vectors = unpack_matrix(self.stub.GetSentenceVectors(request, None).matrix)
+        request.encoding = model_pb2.Matrix.INT8
+        matrix = self.stub.GetSentenceVectors(request, None).matrix
+        self.assertTrue(matrix.encoding == model_pb2.Matrix.INT8)
+        self.assertTrue(len(matrix.data) == vectors.size)
+        self.assertTrue(np.allclose(vectors, unpack_matrix(matrix), atol=0.01))
+
+    def test_newlines(self):
+        request = service_pb2.SentenceVectorsRequest(
+            model_name="correct", batch=["total price", "total\nprice"]
+        )
+        response = self.stub.GetSentenceVectors(request, None)
+        self.assertTrue(response.matrix.rows == 2)
+        self.assertEqual(list(response.invalid), [1])
+        vectors = np.frombuffer(response.matrix.data, dtype="<f4").reshape(2, -1)
+        self.assertFalse(vectors[1].any())
+
+    def test_missing_sentences(self):
+        request = service_pb2.SentenceVectorsRequest(model_name="correct")
+        try:
+            self.stub.GetSentenceVectors(request, None)
+        except grpc.RpcError as error:
+            self.assertTrue(error._state.code == grpc.StatusCode.INVALID_ARGUMENT)
+
+    def test_model_not_loaded(self):
+        request = service_pb2.SentenceVectorsRequest(
+            model_name="fghfdhg", batch=["price"]
+        )
+        try:
+            self.stub.GetSentenceVectors(request, None)
+        except grpc.RpcError as error:
+            self.assertTrue(error._state.code == grpc.StatusCode.FAILED_PRECONDITION)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,10 +13,12 @@
 # limitations under the License.
 
 import grpc
+import numpy as np
 from multiprocessing.pool import ThreadPool
 from test.test_utils import FastTextServingTest
 from threading import Thread
-from fts.protos import service_pb2
+from fts.protos import model_pb2, service_pb2
+from fts.service.matrix import unpack_matrix
 
 
 class TestWordVectors(FastTextServingTest):
@@ -39,6 +41,60 @@ class TestWordVectors(FastTextServingTest):
         self.assertTrue(len(list(response.vectors)) == 2)
         self.assertTrue(response.model.name == request.model_name)
 
+    def test_packed(self):
+        request = service_pb2.VectorsRequest(
+            model_name="correct", batch=["price", "quantity", "total"]
+        )
+        response = self.stub.GetWordsVectors(request, None)
+        request.packed = True
+        matrix = self.stub.GetWordsVectors(request, None).matrix
+        self.assertTrue(matrix.rows == 3)
+        self.assertTrue(matrix.columns == len(response.vectors[0].element))
+        vectors = np.frombuffer(matrix.data, dtype="<f4").reshape(3, matrix.columns)
+        for vector, packed_vector in zip(response.vectors, vectors):
+            self.assertTrue(np.allclose(vector.element, packed_vector))
+
+    def test_encodings(self):
+        request = service_pb2.VectorsRequest(
+            model_name="correct", batch=["price", "quantity", "total"]
+        )
+        response = self.stub.GetWordsVectors(request, None)
+        vectors = np.array([vector.element for vector in response.vectors])
+        for encoding in [model_pb2.Matrix.FLOAT16, model_pb2.Matrix.INT8]:
+            request.encoding = encoding
+            matrix = self.stub.GetWordsVectors(request, None).matrix
+            self.assertTrue(matrix.encoding == encoding)
+            self.assertTrue(matrix.rows == 3)
+            self.assertTrue(len(matrix.data) < vectors.size * 4)
+            decoded = unpack_matrix(matrix)
+            self.assertTrue(np.allclose(vectors, decoded, atol=0.01, rtol=0.01))
+
+    def test_unknown_encoding(self):
+        request = service_pb2.VectorsRequest(
+            model_name="correct", batch=["price"], encoding=7
+        )
+        with self.assertRaises(grpc.RpcError) as error:
+            self.stub.GetWordsVectors(request, None)
+        self.assertEqual(error.exception.code(), grpc.StatusCode.INVALID_ARGUMENT)
+
+    def test_out_of_vocabulary_words(self):
+        request = service_pb2.VectorsRequest(
+            model_name="vectors", batch=["good", "goodish", "food"]
+        )
+        response = self.stub.GetWordsVectors(request, None)
+        self.assertTrue(len(list(response.vectors)) == 3)
+        for vector in response.vectors:
+            self.assertTrue(any(vector.element))
+
+    def test_duplicated_words(self):
+        request = service_pb2.VectorsRequest(
+            model_name="correct", batch=["price", "quantity", "price"]
+        )
+        response = self.stub.GetWordsVectors(request, None)
+        self.assertTrue(len(list(response.vectors)) == 3)
+        self.assertEqual(response.vectors[0], response.vectors[2])
+        self.assertNotEqual(response.vectors[0], response.vectors[1])
+
     def test_missing_model(self):
         request = service_pb2.VectorsRequest(batch=["price"])
         try:
@@ -0,0 +1,87 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from shutil import copytree
+
+from fts.protos import model_pb2, service_pb2
+from fts.service.exceptions import ModelNotLoadedException
+from test.test_utils import TemporaryModelsTest
+
+
+class TestLazyLoading(TemporaryModelsTest):
+    """
+    Three copies of the correct model, with memory for two of them
+    """
+
+    MODEL_NAMES = ["first", "second", "third"]
+
+    def configure(self, config):
+        config["memory"]["available_memory"] = int(self.size * 2.5)
+        config["lazy_loading"] = {"enabled": True, "pinned": ["first"]}
+
+    def predict(self, model_name):
+        request = service_pb2.PredictRequest(
+            model_name=model_name, batch=["total price"], k=1
+        )
+        return self.service.predict(request)
+
+    def get_status(self, model_name):
+        request = service_pb2.ModelStatusRequest(
+            model=model_pb2.ModelSpec(name=model_name)
+        )
+        return self.service.get_model_status(request).status
+
+    def test_load_on_demand(self):
+        self.assertEqual(
+            self.get_status("third").state, model_pb2.ModelStatus.AVAILABLE
+        )
+        self.predict("second")
+        self.assertEqual(self.predict("third").model.name, "third")
+
+        # The least recently used model is evicted, the pinned one is kept
+        self.assertEqual(self.get_status("first").state, model_pb2.ModelStatus.LOADED)
+        self.assertEqual(
+            self.get_status("second").state, model_pb2.ModelStatus.AVAILABLE
+        )
+        third = self.get_status("third").lazy_loading
+        self.assertEqual((third.loads, third.misses), (1, 1))
+        self.assertEqual(self.get_status("second").lazy_loading.evictions, 1)
+
+        self.predict("second")
+        self.assertEqual(self.get_status("third").lazy_loading.evictions, 1)
+        self.assertEqual(self.get_status("second").lazy_loading.loads, 1)
+
+    def test_load_served_versions(self):
+        base_path = self.models_path / "third"
+        copytree(base_path / "1", base_path / "2")
+        self.service._repository.scan(str(base_path))
+        self.service._served_versions["third"] = 2
+        self.service._pinned_models.clear()
+        self.assertEqual(self.predict("third").model.version, 2)
+        self.assertEqual(list(self.get_status("third").served_versions), [1, 2])
+        self.assertEqual(
+            self.get_status("first").state, model_pb2.ModelStatus.AVAILABLE
+        )
+
+    def test_not_enough_memory(self):
+        self.service._pinned_models.add("second")
+        with self.assertRaises(ModelNotLoadedException):
+            self.predict("third")
+        self.assertEqual(self.get_status("third").lazy_loading.misses, 1)
+        self.assertEqual(self.get_status("third").lazy_loading.loads, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -21,6 +21,7 @@ import grpc
 import yaml
 from fts.protos import model_pb2, service_pb2
 from fts.utils.config import get_config
+from fts.utils.logger import get_logger
 
 
 class TestModelLoading(FastTextServingTest):
@@ -167,6 +168,14 @@ class TestModelLoading(FastTextServingTest):
         )
         self.revert_model_changes()
 
+    def test_load_report(self):
+        with self.assertLogs(get_logger(), "INFO") as logs:
+            self.stub.ReloadConfigModels(service_pb2.ReloadModelsRequest())
+        report = [line for line in logs.output if "models loaded in" in line]
+        self.assertEqual(len(report), 1)
+        self.assertIn("correct: loaded in", report[0])
+        self.assertIn("corrupt: not loaded in", report[0])
+
     def test_reloading_new_model(self):
 
         # Configure a new model
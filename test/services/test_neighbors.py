@@ -0,0 +1,57 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from fts.service.neighbors import IVFIndex, normalize
+
+
+class TestIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = Path(self.directory.name) / "model.ivf"
+        random = np.random.default_rng(0)
+        self.vectors = normalize(random.standard_normal((50, 4)))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_and_load(self):
+        index = IVFIndex.build(self.vectors, lists=4)
+        index.save(self.path)
+        loaded = IVFIndex.load(self.path, 50, 4)
+        self.assertTrue(isinstance(loaded.vectors, np.memmap))
+        self.assertTrue(np.array_equal(loaded.ids, index.ids))
+        self.assertLess(loaded.memory, index.memory)
+        self.assertEqual(list(self.path.parent.iterdir()), [self.path])
+
+    def test_keep_saved_index(self):
+        # Another process saved its index while this one was building
+        IVFIndex.build(self.vectors, lists=4).save(self.path)
+        IVFIndex.build(self.vectors, lists=2).save(self.path)
+        self.assertEqual(len(IVFIndex.load(self.path, 50, 4).centroids), 4)
+        self.assertEqual(list(self.path.parent.iterdir()), [self.path])
+
+    def test_save_error(self):
+        index = IVFIndex.build(self.vectors, lists=4)
+        with self.assertRaises(OSError):
+            index.save(self.path.parent / "missing" / "model.ivf")
+
+
+if __name__ == "__main__":
+    unittest.main()
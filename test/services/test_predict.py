@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import grpc
+import numpy as np
 from multiprocessing.pool import ThreadPool
 from test.test_utils import FastTextServingTest
 from threading import Thread
@@ -43,6 +44,101 @@ class TestPredict(FastTextServingTest):
         self.assertTrue(len(response.predictions[0].scores) == 2)
         self.assertTrue(response.model.name == request.model_name)
 
+    def test_labels_without_prefix(self):
+        request = service_pb2.PredictRequest(
+            model_name="correct", batch=["price"], k=-1
+        )
+        response = self.stub.Predict(request, None)
+        self.assertEqual(sorted(response.predictions[0].labels), ["1", "2"])
+
+    def test_threshold(self):
+        request = service_pb2.PredictRequest(
+            model_name="correct", batch=["total price", "quantity"], k=-1, threshold=0.5
+        )
+        response = self.stub.Predict(request, None)
+        for prediction in response.predictions:
+            self.assertTrue(len(prediction.labels) == 1)
+            self.assertTrue(prediction.scores[0] >= 0.5)
+
+    def test_allowed_labels(self):
+        request = service_pb2.PredictRequest(
+            model_name="correct", batch=["total price", "quantity"], k=1, labels=["1"]
+        )
+        response = self.stub.Predict(request, None)
+        for prediction in response.predictions:
+            self.assertEqual(list(prediction.labels), ["1"])
+
+    def test_unknown_allowed_label(self):
+        request = service_pb2.PredictRequest(
+            model_name="correct", batch=["price"], k=1, labels=["foo"]
+        )
+        with self.assertRaises(grpc.RpcError) as error:
+            self.stub.Predict(request, None)
+        self.assertTrue(error.exception.code() == grpc.StatusCode.INVALID_ARGUMENT)
+
+    def test_invalid_k(self):
+        for labels in [[], ["1"]]:
+            request = service_pb2.PredictRequest(
+                model_name="correct", batch=["price"], k=0, labels=labels
+            )
+            with self.assertRaises(grpc.RpcError) as error:
+                self.stub.Predict(request, None)
+            self.assertEqual(error.exception.code(), grpc.StatusCode.INVALID_ARGUMENT)
+
+    def test_packed(self):
+        batch = ["total price", "quantity", "anything"]
+        request = service_pb2.PredictRequest(model_name="correct", batch=batch, k=2)
+        response = self.stub.Predict(request, None)
+        request.packed = True
+        packed_response = self.stub.Predict(request, None)
+        packed = packed_response.packed_predictions
+        self.assertTrue(len(packed_response.predictions) == 0)
+        self.assertTrue(packed.k == 2)
+        indices = np.frombuffer(packed.label_indices, dtype="<i4").reshape(3, 2)
+        scores = np.frombuffer(packed.scores, dtype="<f4").reshape(3, 2)
+        for prediction, k_indices, k_scores in zip(
+            response.predictions, indices, scores
+        ):
+            self.assertEqual(
+                list(prediction.labels), [packed.labels[i] for i in k_indices]
+            )
+            self.assertTrue(np.allclose(prediction.scores, k_scores))
+
+    def test_duplicates(self):
+        batch = ["total price", "quantity", "total price", "total price"]
+        request = service_pb2.PredictRequest(model_name="correct", batch=batch, k=2)
+        response = self.stub.Predict(request, None)
+        self.assertTrue(len(response.predictions) == 4)
+        self.assertEqual(response.predictions[0], response.predictions[2])
+        self.assertEqual(response.predictions[0], response.predictions[3])
+        request = service_pb2.PredictRequest(
+            model_name="correct", batch=["quantity"], k=2
+        )
+        self.assertEqual(
+            self.stub.Predict(request, None).predictions[0], response.predictions[1]
+        )
+
+    def test_stream(self):
+        requests = [
+            service_pb2.PredictRequest(model_name="correct", batch=[str(i)] * i, k=1)
+            for i in range(1, 50)
+        ]
+        responses = list(self.stub.PredictStream(iter(requests)))
+        self.assertTrue(len(responses) == len(requests))
+        for request, response in zip(requests, responses):
+            self.assertTrue(len(response.predictions) == len(request.batch))
+            self.assertTrue(response.model.name == request.model_name)
+
+    def test_stream_not_loaded_model(self):
+        requests = [
+            service_pb2.PredictRequest(model_name="correct", batch=["price"], k=1),
+            service_pb2.PredictRequest(model_name="folder", batch=["price"], k=1),
+        ]
+        responses = self.stub.PredictStream(iter(requests))
+        with self.assertRaises(grpc.RpcError) as error:
+            list(responses)
+        self.assertTrue(error.exception.code() == grpc.StatusCode.FAILED_PRECONDITION)
+
     def test_missing_model(self):
         request = service_pb2.PredictRequest(batch=["price"])
         try:
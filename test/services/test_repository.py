@@ -0,0 +1,73 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from fts.service.repository import ModelRepository
+
+
+class TestRepository(unittest.TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.base_path = Path(self.directory.name) / "model"
+        for version in ["9", "10", "tmp"]:
+            self.publish(version)
+        self.repository = ModelRepository()
+        self.repository.scan(str(self.base_path))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def publish(self, version, name="model.bin", size=10):
+        path = self.base_path / version / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"0" * size)
+        return path
+
+    def test_numeric_order(self):
+        versions = self.repository.get_versions(str(self.base_path))
+        self.assertEqual([version.number for version in versions], [9, 10])
+        model = self.repository.get_model(str(self.base_path))
+        self.assertEqual(model.path, self.base_path / "10" / "model.bin")
+        self.assertEqual(model.size, 10)
+        self.assertEqual(self.repository.get_model(str(self.base_path), 9).size, 10)
+
+    def test_update(self):
+        path = self.publish("11", size=20)
+
+        # Not seen until its path is reported
+        self.assertEqual(self.repository.get_model(str(self.base_path)).size, 10)
+        self.repository.update(str(self.base_path), [str(path)])
+        self.assertEqual(self.repository.get_model(str(self.base_path)).path, path)
+        self.assertEqual(self.repository.get_model(str(self.base_path)).size, 20)
+
+    def test_poll(self):
+        path = self.publish("100")
+        self.repository.poll(str(self.base_path))
+        self.assertEqual(self.repository.get_model(str(self.base_path)).path, path)
+
+        # Files changed in the latest version are found without a new version
+        self.publish("100", "other.ftz")
+        self.repository.poll(str(self.base_path))
+        self.assertIsNone(self.repository.get_model(str(self.base_path)))
+
+    def test_missing_base_path(self):
+        self.assertEqual(self.repository.get_versions("not_existing"), [])
+        self.assertIsNone(self.repository.get_model("not_existing"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import unittest
+
+from fts.protos import service_pb2
+from fts.service.exceptions import FastTextException
+from test.test_utils import TemporaryModelsTest
+
+
+class TestSharding(TemporaryModelsTest):
+    def configure(self, config):
+        config["sharding"] = {
+            "enabled": True,
+            "processes": 2,
+            "shard_size": 10,
+            "max_shards": 3,
+        }
+
+    def tearDown(self):
+        self.service._shards.invalidate()
+        super().tearDown()
+
+    def predict(self, batch):
+        request = service_pb2.PredictRequest(model_name="model", batch=batch, k=2)
+        return self.service.predict(request)
+
+    def test_shards_joined_in_order(self):
+        words = self.service._models["model"].ft_model.get_words()
+        batch = [f"{words[i % len(words)]} {i}" for i in range(95)]
+        response = self.predict(batch)
+        ft_labels, scores = self.service._models["model"].ft_model.predict(batch, k=2)
+        self.assertEqual(len(response.predictions), 95)
+        for prediction, k_labels, k_scores in zip(
+            response.predictions, ft_labels, scores
+        ):
+            self.assertEqual(
+                list(prediction.labels),
+                [label.replace("__label__", "") for label in k_labels],
+            )
+            self.assertEqual(list(prediction.scores), list(k_scores.astype(float)))
+
+    def test_max_shards(self):
+        shards = self.service._shards._split([str(i) for i in range(95)])
+        self.assertEqual([len(shard) for shard in shards], [32, 32, 31])
+        self.assertEqual(len(self.service._shards._split(["a"] * 10)), 1)
+        self.assertEqual(len(self.service._shards._split(["a"] * 11)), 2)
+
+    def test_small_batches_not_sharded(self):
+        self.predict(["total price"] * 5)
+        self.assertIsNone(self.service._shards._pool)
+
+    def test_forked_again_after_loading(self):
+        self.predict([str(i) for i in range(20)])
+        pool = self.service._shards._pool
+        self.assertEqual(self.service._shards._pid, os.getpid())
+        self.assertEqual(self.service._shards._versions, {("model", 1)})
+
+        self.service._load_model("model", self.models_path / "model")
+        self.assertIsNone(self.service._shards._pool)
+        self.assertEqual(len(self.predict([str(i) for i in range(20)]).predictions), 20)
+        self.assertIsNot(self.service._shards._pool, pool)
+
+    def test_errors_of_shards(self):
+        with self.assertRaises(FastTextException):
+            self.predict([str(i) for i in range(19)] + ["bad\ntext"])
+        self.assertEqual(len(self.predict([str(i) for i in range(20)]).predictions), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
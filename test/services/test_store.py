@@ -0,0 +1,73 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from fts.service.store import EmbeddingStore
+
+
+class TestStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = Path(self.directory.name) / "model.vectors"
+        self.words = ["</s>", "price", "total", "precio", "größe"]
+        self.matrix = np.arange(15, dtype=np.float32).reshape(5, 3)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_export_and_load(self):
+        EmbeddingStore.export(self.path, self.words, self.matrix)
+        store = EmbeddingStore.load(self.path, 5, 3)
+        self.assertTrue(isinstance(store.matrix, np.memmap))
+        self.assertTrue(np.array_equal(store.matrix, self.matrix))
+        self.assertEqual(len(store), 5)
+        self.assertEqual([store[row] for row in range(5)], self.words)
+        self.assertEqual(list(self.path.parent.iterdir()), [self.path])
+
+    def test_lookup(self):
+        EmbeddingStore.export(self.path, self.words, self.matrix)
+        store = EmbeddingStore.load(self.path, 5, 3)
+        rows = store.lookup(["total", "unknown", "größe", "price"])
+        self.assertEqual(list(rows), [2, -1, 4, 1])
+        self.assertEqual(store.get("precio"), 3)
+        self.assertEqual(store.get("quantity", -1), -1)
+
+    def test_keep_exported_store(self):
+        # Another process exported the store while this one was writing it
+        EmbeddingStore.export(self.path, self.words, self.matrix)
+        EmbeddingStore.export(self.path, self.words, self.matrix + 1)
+        store = EmbeddingStore.load(self.path, 5, 3)
+        self.assertTrue(np.array_equal(store.matrix, self.matrix))
+        self.assertEqual(list(self.path.parent.iterdir()), [self.path])
+
+    def test_export_error(self):
+        with self.assertRaises(OSError):
+            EmbeddingStore.export(
+                self.path.parent / "missing" / "model.vectors", self.words, self.matrix
+            )
+
+    def test_wrong_shape(self):
+        EmbeddingStore.export(self.path, self.words, self.matrix)
+        self.assertTrue(EmbeddingStore.load(self.path, 5, 4) is None)
+        self.assertTrue(EmbeddingStore.load(self.path, 6, 3) is None)
+        self.assertTrue(EmbeddingStore.load(self.path.with_name("foo"), 5, 3) is None)
+
+
+if __name__ == "__main__":
+    unittest.main()
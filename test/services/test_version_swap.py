@@ -0,0 +1,165 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from shutil import copytree
+from unittest import mock
+
+from fts.protos import model_pb2, service_pb2
+from fts.service import fasttext_service
+from fts.service.cache import PredictionCache
+from fts.service.exceptions import ModelNotLoadedException
+from test.test_utils import TemporaryModelsTest
+
+
+class TestVersionSwap(TemporaryModelsTest):
+    """
+    A copy of the correct model, with memory for three versions of it
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.base_path = self.models_path / "model"
+
+    def configure(self, config):
+        config["memory"]["available_memory"] = int(self.size * 3.5)
+
+    def publish_version(self, version):
+        copytree(self.base_path / "1", self.base_path / str(version))
+        self.service._repository.update(
+            str(self.base_path), [str(self.base_path / str(version))]
+        )
+        return self.service._load_model("model", self.base_path)
+
+    def predict(self, version=0):
+        request = service_pb2.PredictRequest(
+            model_name="model", batch=["total price"], k=1, version=version
+        )
+        return self.service.predict(request)
+
+    def get_status(self):
+        request = service_pb2.ModelStatusRequest(
+            model=model_pb2.ModelSpec(name="model")
+        )
+        return self.service.get_model_status(request).status
+
+    def get_memory(self):
+        return self.get_status().memory
+
+    def test_swap_without_requests(self):
+        self.assertTrue(self.publish_version(2))
+        self.assertEqual(self.predict().model.version, 2)
+        self.assertEqual(self.get_memory().retired, 0)
+        self.assertEqual(self.service._available_memory, int(self.size * 2.5))
+
+    def test_swap_drains_requests(self):
+        with self.service._using_model("model"):
+            previous = self.service._models["model"].ft_model
+            self.assertTrue(self.publish_version(2))
+
+            # New requests use the new version, the previous one is kept
+            self.assertEqual(self.predict().model.version, 2)
+            self.assertEqual(self.get_memory().retired, self.size)
+            self.assertEqual(self.service._available_memory, int(self.size * 1.5))
+            self.assertEqual(len(previous.predict(["total price"])[0]), 1)
+
+        # Freed once the requests started before the swap finish
+        self.assertEqual(self.get_memory().retired, 0)
+        self.assertEqual(self.service._available_memory, int(self.size * 2.5))
+
+    def test_untracked_after_requests(self):
+        self.predict()
+        with self.assertRaises(ModelNotLoadedException):
+            self.service.predict(
+                service_pb2.PredictRequest(model_name="unknown", batch=["a"], k=1)
+            )
+        self.assertEqual(self.service._in_flight, {})
+        self.assertEqual(self.service._generation_requests, {})
+        self.assertNotIn("unknown", self.service._generations)
+        self.assertNotIn("unknown", self.service._retired)
+
+    def test_not_enough_memory_keeps_version(self):
+        with self.service._using_model("model"):
+            self.assertTrue(self.publish_version(2))
+            self.assertTrue(self.publish_version(3))
+            self.assertFalse(self.publish_version(4))
+        self.assertEqual(self.predict().model.version, 3)
+        self.assertEqual(self.get_memory().retired, 0)
+
+    def test_serve_last_versions(self):
+        self.service._served_versions["model"] = 2
+        self.assertTrue(self.publish_version(2))
+        self.assertEqual(self.predict().model.version, 2)
+        self.assertEqual(self.predict(version=1).model.version, 1)
+        request = service_pb2.VectorsRequest(
+            model_name="model", batch=["price"], version=1
+        )
+        self.assertEqual(self.service.get_words_vectors(request).model.version, 1)
+        self.assertEqual(list(self.get_status().served_versions), [1, 2])
+        self.assertEqual(self.service._available_memory, int(self.size * 1.5))
+
+        # The oldest version is unloaded when a newer one arrives
+        self.assertTrue(self.publish_version(3))
+        self.assertEqual(list(self.get_status().served_versions), [2, 3])
+        with self.assertRaises(ModelNotLoadedException):
+            self.predict(version=1)
+        self.assertEqual(self.service._available_memory, int(self.size * 1.5))
+
+    def test_keep_cache_of_served_versions(self):
+        self.service._cache = PredictionCache(100000)
+        self.service._served_versions["model"] = 2
+        self.predict()
+        self.assertTrue(self.publish_version(2))
+        self.assertEqual(self.get_status().cache.entries, 1)
+
+        # Version 1 is no longer served once version 3 is loaded
+        self.assertTrue(self.publish_version(3))
+        self.assertEqual(self.get_status().cache.entries, 0)
+
+    def test_swap_during_request(self):
+        self.service._cache = PredictionCache(100000)
+        deduplicate = self.service._deduplicate
+
+        def swap(*args):
+            self.assertTrue(self.publish_version(2))
+            return deduplicate(*args)
+
+        with mock.patch.object(
+            self.service, "_deduplicate", side_effect=swap
+        ), mock.patch.object(
+            self.service, "_predict", wraps=self.service._predict
+        ) as predict:
+            response = self.predict()
+
+        # Predicted and cached with the version resolved when the request started
+        self.assertEqual(response.model.version, 1)
+        self.assertEqual(predict.call_args[0][2], 1)
+        self.assertEqual(self.predict().model.version, 2)
+        self.assertEqual(self.get_status().cache.misses, 2)
+
+    def test_load_last_versions(self):
+        copytree(self.base_path / "1", self.base_path / "2")
+        self.config["models"][0]["versions"] = 2
+        self.write_config()
+        service = fasttext_service.FastTextService(watch_models=False)
+        request = service_pb2.ModelStatusRequest(
+            model=model_pb2.ModelSpec(name="model")
+        )
+        status = service.get_model_status(request).status
+        self.assertEqual(list(status.served_versions), [1, 2])
+        self.assertEqual(status.version, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
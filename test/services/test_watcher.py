@@ -0,0 +1,102 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+import unittest
+from pathlib import Path
+from shutil import copytree
+from tempfile import TemporaryDirectory
+
+from fts.service.repository import ModelRepository
+from fts.service.watcher import ModelWatcher
+
+MODEL_PATH = "test/resources/models/correct"
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.models_path = Path(self.directory.name)
+        self.base_path = self.models_path / "model"
+        copytree(MODEL_PATH, self.base_path)
+        self.reloads = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def start(self, **kwargs):
+        watcher = ModelWatcher(
+            str(self.models_path),
+            lambda: [str(self.base_path)],
+            ModelRepository(),
+            self.reloads.append,
+            debounce=0.1,
+            **kwargs,
+        )
+        watcher.start()
+        return watcher
+
+    def wait_reloads(self, count, timeout=3):
+        deadline = time.monotonic() + timeout
+        while len(self.reloads) < count and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.3)
+        return self.reloads
+
+    def test_atomic_rename(self):
+        self.start()
+        copytree(self.base_path / "1", self.models_path / "tmp")
+        (self.models_path / "tmp").rename(self.base_path / "2")
+        self.assertEqual(self.wait_reloads(1), [str(self.base_path)])
+
+    def test_coalesced_events(self):
+        watcher = self.start()
+        copytree(self.base_path / "1", self.base_path / "2")
+        for path in (self.base_path / "2").iterdir():
+            watcher.notify(str(path))
+        self.assertEqual(self.wait_reloads(1), [str(self.base_path)])
+
+    def test_files_saved_with_the_model(self):
+        self.start()
+        (self.base_path / "1" / "model.vectors").mkdir()
+        (self.base_path / "1" / "model.vectors" / "matrix.npy").touch()
+        self.assertEqual(self.wait_reloads(1, timeout=1), [])
+
+    def test_marker(self):
+        self.start(marker="_SUCCESS")
+        copytree(self.base_path / "1", self.base_path / "2")
+        self.assertEqual(self.wait_reloads(1, timeout=1), [])
+        (self.base_path / "2" / "_SUCCESS").touch()
+        self.assertEqual(self.wait_reloads(1), [str(self.base_path)])
+
+    def test_symlink_swap(self):
+        # Kubernetes volumes publish a new version by swapping a symlink
+        for name in ["first", "second"]:
+            copytree(self.base_path, self.models_path / name)
+        self.base_path = self.models_path / "linked"
+        self.base_path.symlink_to("first")
+        self.start()
+        (self.models_path / "tmp").symlink_to("second")
+        os.replace(self.models_path / "tmp", self.base_path)
+        self.assertEqual(self.wait_reloads(1), [str(self.base_path)])
+
+    def test_polling(self):
+        self.start(polling=True, poll_interval=0.1)
+        copytree(self.base_path / "1", self.base_path / "2")
+        self.assertEqual(self.wait_reloads(1), [str(self.base_path)])
+
+
+if __name__ == "__main__":
+    unittest.main()
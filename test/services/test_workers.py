@@ -0,0 +1,94 @@
+# Copyright 2020 Nielsen Global Connect.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import multiprocessing
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from fts.protos import model_pb2, service_pb2
+from fts.server.workers import WorkerPool
+from fts.service.exceptions import NotEnabledException
+from fts.service.fasttext_service import FastTextService
+
+
+def _run_worker(fasttext_service, results, ready):
+    """
+    Report what the worker serves, then wait to be stopped
+    """
+    fasttext_service.serve_loaded_models()
+    request = service_pb2.PredictRequest(
+        model_name="correct", batch=["total price"], k=1
+    )
+    results.put(fasttext_service.predict(request).model.version)
+    try:
+        fasttext_service.load_models(
+            service_pb2.LoadModelsRequest(
+                models=[model_pb2.ModelSpec(name="other", base_path="other")]
+            )
+        )
+        results.put("loaded")
+    except NotEnabledException:
+        results.put("not loaded")
+    ready.set()
+    while True:
+        time.sleep(1)
+
+
+class TestWorkers(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.fasttext_service = FastTextService(watch_models=False)
+
+    def setUp(self):
+        self.results = multiprocessing.get_context("fork").Queue()
+        self.workers = WorkerPool(
+            _run_worker, 2, args=(self.fasttext_service, self.results)
+        )
+
+    def tearDown(self):
+        for worker in self.workers._workers:
+            worker.terminate()
+            worker.join()
+
+    def test_workers_serve_loaded_models(self):
+        self.workers.roll()
+        results = [self.results.get(timeout=10) for _ in range(4)]
+        self.assertEqual(sorted(results, key=str), [1, 1, "not loaded", "not loaded"])
+
+    def test_roll(self):
+        self.workers.roll()
+        previous = self.workers._workers
+        self.workers.roll()
+        for worker in previous:
+            worker.join(10)
+            self.assertFalse(worker.is_alive())
+        self.assertEqual(len(self.workers._workers), 2)
+        self.assertTrue(all(worker.is_alive() for worker in self.workers._workers))
+
+    def test_roll_after_reload(self):
+        on_reload = mock.Mock()
+        self.fasttext_service._on_reload = on_reload
+        try:
+            self.fasttext_service._reload_version(
+                "correct", Path("test/resources/models/correct")
+            )
+        finally:
+            self.fasttext_service._on_reload = None
+        on_reload.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main()
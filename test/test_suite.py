@@ -25,17 +25,51 @@ os.environ["SERVICE_CONFIG_PATH"] = "test/resources/test-config.yaml"
 from test.services.test_model_loading import TestModelLoading
 from test.services.test_predict import TestPredict
 from test.services.test_get_word_vectors import TestWordVectors
+from test.services.test_get_sentence_vectors import TestSentenceVectors
+from test.services.test_get_nearest_neighbors import (
+    TestNearestNeighbors,
+    TestSavedVectors,
+)
 from test.services.test_model_updating import TestModelUpdating
-from test.services.test_get_model_status import TestModelStatus
+from test.services.test_get_model_status import TestModelStatus, TestMeasuredMemory
+from test.services.test_batching import TestBatching
+from test.services.test_sharding import TestSharding
+from test.services.test_cache import TestCache
+from test.services.test_disk_cache import TestDiskCache, TestServiceDiskCache
+from test.services.test_store import TestStore
+from test.services.test_neighbors import TestIndex
+from test.services.test_lazy_loading import TestLazyLoading
+from test.services.test_version_swap import TestVersionSwap
+from test.services.test_watcher import TestWatcher
+from test.services.test_repository import TestRepository
+from test.services.test_aio_server import TestAsyncServer
+from test.services.test_workers import TestWorkers
 
 
 def suite():
     test_list = [
         TestModelStatus,
+        TestMeasuredMemory,
         TestWordVectors,
+        TestSentenceVectors,
+        TestNearestNeighbors,
+        TestSavedVectors,
         TestPredict,
         TestModelLoading,
         TestModelUpdating,
+        TestBatching,
+        TestSharding,
+        TestCache,
+        TestDiskCache,
+        TestServiceDiskCache,
+        TestStore,
+        TestIndex,
+        TestLazyLoading,
+        TestVersionSwap,
+        TestWatcher,
+        TestRepository,
+        TestAsyncServer,
+        TestWorkers,
     ]
 
     test_load = unittest.TestLoader()
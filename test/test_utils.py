@@ -16,13 +16,17 @@ import os
 import grpc
 import time
 import unittest
+import yaml
 from concurrent import futures
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from threading import Thread
 from shutil import copy, copytree, rmtree
+from unittest import mock
 
 from fts.protos import service_pb2, service_pb2_grpc
 from fts.server import FastTextServicer
+from fts.service import fasttext_service
 
 
 def _start_grpc_server(cls):
@@ -117,3 +121,52 @@ class FastTextServingTest(unittest.TestCase):
         os.remove(cls.CONFIG_PATH)
         copy(cls.CONFIG_BACKUP_PATH, cls.CONFIG_PATH)
         cls.stub.ReloadConfigModels(service_pb2.ReloadModelsRequest())
+
+
+class TemporaryModelsTest(unittest.TestCase):
+    """
+    Copies of the correct model in a temporary models path, one per model name,
+    served in process. Subclasses adjust the configuration in configure
+    """
+
+    MODEL_PATH = Path("test/resources/models/correct")
+    MODEL_NAMES = ["model"]
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.models_path = Path(self.directory.name)
+        for name in self.MODEL_NAMES:
+            copytree(self.MODEL_PATH, self.models_path / name)
+        self.size = next(self.MODEL_PATH.glob("1/*")).stat().st_size
+        self.config = {
+            "logging_level": "INFO",
+            "memory": {
+                "available_memory": self.size * 10,
+                "memory_factor": 1.0,
+                "measure": False,
+            },
+            "models_path": str(self.models_path),
+            "models": [{"name": name} for name in self.MODEL_NAMES],
+        }
+        self.configure(self.config)
+        self.config_path = self.models_path / "config.yaml"
+        self.write_config()
+        self.patches = [
+            mock.patch.dict(os.environ, {"SERVICE_CONFIG_PATH": str(self.config_path)}),
+            mock.patch.object(fasttext_service, "config", self.config),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.service = fasttext_service.FastTextService(watch_models=False)
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.directory.cleanup()
+
+    def configure(self, config: dict):
+        pass
+
+    def write_config(self):
+        with open(self.config_path, "w") as config_file:
+            yaml.safe_dump(self.config, config_file)